@@ -1,82 +1,90 @@
 import pandas as pd
 
+from iScale_Backend import get_backend
+from iScale_Simulator import SlotPolicySimulator
+from iScale_Journey import journey_attribution, journey_summary
+
 class iScaleAnalyzer:
-    def __init__(self, file_path):
+    def __init__(self, file_path, backend='pandas'):
         self.file_path = file_path
-        self.df = None
+        self.backend = get_backend(backend, low_memory=False) if backend == 'pandas' else get_backend(backend)
+        self.journeys = None
+        self.load_error = None
+        
+    @property
+    def df(self):
+        return self.backend.df
+        
+    @property
+    def loaded(self):
+        return self.backend.loaded
         
     def load_and_process_data(self):
         try:
-            self.df = pd.read_csv(self.file_path, low_memory=False)
-            datetime_cols = ['handled_time', 'slot_start_time', 'payment_time']
-            for col in datetime_cols:
-                self.df[col] = pd.to_datetime(self.df[col], errors='coerce')
-            
-            self.df['conversion_flag'] = (~self.df['payment_time'].isna()).astype(int)
-            self.df['connectivity_flag'] = (self.df['booked_flag'] == 'Booked').astype(int)
-            self.df['slot_hour'] = self.df['slot_start_time'].dt.hour
-            self.df['conversion_days'] = (self.df['payment_time'] - self.df['slot_start_time']).dt.days
-            self.df['lead_type'] = self.df['India vs NRI'] + '_' + self.df['medicalconditionflag'].map({
-                True: 'Medical', False: 'NonMedical', 'Yes': 'Medical', 'No': 'NonMedical'
-            })
+            self.journeys = None
+            self.load_error = None
+            self.backend.load(self.file_path)
             return True
-        except:
+        except Exception as e:
+            self.load_error = str(e)
             return False
     
+    def require(self, *features):
+        return self.backend.require(*features)
+    
+    def get_data_quality(self):
+        if not self.loaded: return None
+        return self.backend.quality
+    
     def get_basic_metrics(self):
-        if self.df is None: return None
+        if not self.loaded: return None
+        total_consultations = self.backend.row_count()
+        total_conversions = self.backend.totals(['conversions'])['conversions']
+        user_summary = self.analyze_user_journeys()['summary']
         return {
-            'total_consultations': len(self.df),
-            'total_conversions': self.df['conversion_flag'].sum(),
-            'overall_conversion_rate': (self.df['conversion_flag'].sum() / len(self.df) * 100),
-            'active_coaches': self.df['expert_id'].nunique(),
-            'unique_funnels': self.df['funnel'].nunique(),
-            'unique_lead_types': self.df['lead_type'].nunique()
+            'total_consultations': total_consultations,
+            'total_users': user_summary['total_users'],
+            'converted_users': user_summary['converted_users'],
+            'user_conversion_rate': user_summary['user_conversion_rate'],
+            'avg_consultations_to_conversion': user_summary['avg_consultations_to_conversion'],
+            'total_conversions': total_conversions,
+            'overall_conversion_rate': (total_conversions / total_consultations * 100),
+            'active_coaches': self.backend.distinct_count('expert_id'),
+            'unique_funnels': self.backend.distinct_count('funnel'),
+            'unique_lead_types': self.backend.distinct_count('lead_type')
         }
     
     def calculate_conversion_rates(self, days):
-        if self.df is None: return None
-        conversion_mask = (self.df['conversion_days'] <= days) & (self.df['conversion_days'] >= 0)
-        
-        conversion_stats = self.df.groupby(['funnel', 'lead_type']).agg({
-            'user_id': 'count', 'conversion_flag': 'sum'
-        }).reset_index()
-        
-        conversion_within_days = self.df[conversion_mask].groupby(['funnel', 'lead_type']).agg({
-            'conversion_flag': 'sum'
-        }).reset_index()
-        conversion_within_days.rename(columns={'conversion_flag': f'conversions_{days}d'}, inplace=True)
-        
-        result = conversion_stats.merge(conversion_within_days, on=['funnel', 'lead_type'], how='left')
-        result[f'conversions_{days}d'] = result[f'conversions_{days}d'].fillna(0)
+        if not self.loaded: return None
+        result = self.backend.aggregate(
+            ['funnel', 'lead_type'], ['consultations', 'conversions', 'conversions_within'], within_days=days
+        ).rename(columns={
+            'consultations': 'user_id', 'conversions': 'conversion_flag', 'conversions_within': f'conversions_{days}d'
+        })
         result[f'conversion_rate_{days}d'] = (result[f'conversions_{days}d'] / result['user_id'] * 100).round(2)
         
         return result
     
-    def analyze_hourly_performance(self):
-        if self.df is None: return None
-        hourly_stats = self.df.groupby('slot_hour').agg({
-            'user_id': 'count',
-            'connectivity_flag': 'sum',
-            'conversion_flag': 'sum'
-        }).reset_index()
+    def analyze_hourly_performance(self, by=None):
+        if not self.loaded: return None
+        hourly_stats = self.backend.aggregate(
+            list(by or []) + ['slot_hour'], ['consultations', 'connected', 'conversions']
+        ).rename(columns={'consultations': 'user_id', 'connected': 'connectivity_flag', 'conversions': 'conversion_flag'})
         hourly_stats['connectivity_rate'] = (hourly_stats['connectivity_flag'] / hourly_stats['user_id'] * 100).round(2)
         hourly_stats['conversion_rate'] = (hourly_stats['conversion_flag'] / hourly_stats['user_id'] * 100).round(2)
         return hourly_stats
     
     def analyze_coach_performance(self):
-        if self.df is None: return None
-        coach_stats = self.df.groupby(['expert_id', 'target_class']).agg({
-            'user_id': 'count',
-            'conversion_flag': 'sum'
-        }).reset_index()
+        if not self.loaded: return None
+        coach_stats = self.backend.aggregate(
+            ['expert_id', 'target_class'], ['consultations', 'conversions']
+        ).rename(columns={'consultations': 'user_id', 'conversions': 'conversion_flag'})
         coach_stats['conversion_rate'] = (coach_stats['conversion_flag'] / coach_stats['user_id'] * 100).round(2)
         coach_stats['coach_name'] = 'Coach_' + coach_stats['expert_id'].astype(str)
         
-        coach_class_stats = self.df.groupby('target_class').agg({
-            'user_id': 'count',
-            'conversion_flag': 'sum'
-        }).reset_index()
+        coach_class_stats = self.backend.aggregate(
+            ['target_class'], ['consultations', 'conversions']
+        ).rename(columns={'consultations': 'user_id', 'conversions': 'conversion_flag'})
         coach_class_stats['conversion_rate'] = (coach_class_stats['conversion_flag'] / coach_class_stats['user_id'] * 100).round(2)
         coach_class_stats = coach_class_stats.sort_values('conversion_rate', ascending=False)
         
@@ -86,20 +94,29 @@ class iScaleAnalyzer:
         }
     
     def analyze_funnel_performance(self):
-        if self.df is None: return None
-        funnel_stats = self.df.groupby('funnel').agg({
-            'user_id': 'count',
-            'conversion_flag': 'sum'
-        }).reset_index()
+        if not self.loaded: return None
+        funnel_stats = self.backend.aggregate(
+            ['funnel'], ['consultations', 'conversions']
+        ).rename(columns={'consultations': 'user_id', 'conversions': 'conversion_flag'})
         funnel_stats['conversion_rate'] = (funnel_stats['conversion_flag'] / funnel_stats['user_id'] * 100).round(2)
         return funnel_stats.sort_values('conversion_rate', ascending=False)
     
+    def analyze_user_journeys(self):
+        if not self.loaded: return None
+        if self.journeys is None:
+            self.journeys = self.backend.user_journeys()
+        return {
+            'summary': journey_summary(self.journeys),
+            'first_touch': journey_attribution(self.journeys, 'first'),
+            'last_touch': journey_attribution(self.journeys, 'last')
+        }
+    
     def get_distribution_data(self):
-        if self.df is None: return None
-        return self.df[['funnel', 'lead_type', 'target_class', 'slot_hour', 'conversion_flag']].copy()
+        if not self.loaded: return None
+        return self.backend.columns(['funnel', 'lead_type', 'target_class', 'slot_hour', 'conversion_flag']).copy()
     
     def generate_key_insights(self):
-        if self.df is None: return None
+        if not self.loaded: return None
         
         hourly_stats = self.analyze_hourly_performance()
         coach_analysis = self.analyze_coach_performance()
@@ -114,6 +131,7 @@ class iScaleAnalyzer:
         
         best_funnel = funnel_analysis.iloc[0]
         worst_funnel = funnel_analysis.iloc[-1]
+        total_consultations = self.backend.row_count()
         
         return {
             'timing': {
@@ -135,8 +153,8 @@ class iScaleAnalyzer:
                 'performance_gap': best_funnel['conversion_rate'] - worst_funnel['conversion_rate']
             },
             'overall': {
-                'total_consultations': len(self.df),
-                'overall_conversion_rate': (self.df['conversion_flag'].mean() * 100)
+                'total_consultations': total_consultations,
+                'overall_conversion_rate': (self.backend.totals(['conversions'])['conversions'] / total_consultations * 100)
             }
         }
     
@@ -148,9 +166,11 @@ class iScaleAnalyzer:
         potential_improvement = (insights['coach']['performance_gap'] * 0.3) + (insights['funnel']['performance_gap'] * 0.2)
         potential_rate = current_rate + potential_improvement
         
-        monthly_consultations = len(self.df) * 4
+        monthly_consultations = insights['overall']['total_consultations'] * 4
         additional_conversions = int((potential_rate - current_rate) / 100 * monthly_consultations)
         
+        _, peak_uplift = SlotPolicySimulator.from_analyzer(self, seed=42).compare_peak_share(0.7)
+        
         return {
             'immediate': [
                 f"Focus 70% of slots during peak hours: {', '.join(map(str, insights['timing']['peak_hours']))}",
@@ -167,26 +187,102 @@ class iScaleAnalyzer:
                 'potential_conversion_rate': round(potential_rate, 1),
                 'improvement_percentage': round(potential_improvement, 1),
                 'additional_conversions_monthly': additional_conversions
+            },
+            'peak_hour_simulation': {
+                'peak_share': 0.7,
+                'expected_additional_conversions': round(peak_uplift['uplift_mean'], 1),
+                'additional_conversions_p5': peak_uplift['uplift_p5'],
+                'additional_conversions_p95': peak_uplift['uplift_p95'],
+                'probability_better': peak_uplift['probability_better']
             }
         }
 
-def export_analysis_results(analyzer, output_path="analysis_results.json"):
-    if analyzer.df is None: return False
+EXPORT_FORMATS = ('ndjson', 'parquet')
+EXPORT_BATCH_ROWS = 50_000
+
+def _json_default(value):
+    return value.item() if hasattr(value, 'item') else str(value)
+
+def write_table(frame, path, table_format='ndjson', batch_rows=EXPORT_BATCH_ROWS):
+    """Write ``frame`` one row batch at a time, so only one batch is ever serialized in memory."""
+    if table_format == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = pa.Schema.from_pandas(frame, preserve_index=False)
+        with pq.ParquetWriter(path, schema) as writer:
+            for start in range(0, len(frame), batch_rows):
+                writer.write_table(pa.Table.from_pandas(frame.iloc[start:start + batch_rows], schema=schema, preserve_index=False))
+    else:
+        with open(path, 'w') as f:
+            for start in range(0, len(frame), batch_rows):
+                f.write(frame.iloc[start:start + batch_rows].to_json(orient='records', lines=True, date_format='iso',
+                                                                     default_handler=str))
+    return {'rows': len(frame), 'columns': {str(col): str(dtype) for col, dtype in frame.dtypes.items()}}
+
+def read_table(manifest_path, name):
+    """Load one exported table back from its manifest.
+
+    NDJSON keeps no types, so its columns are cast back to the dtypes the
+    manifest recorded (categories are re-derived from the values).
+    """
+    import json
+    import os
+    with open(manifest_path, 'r') as f:
+        entry = json.load(f)['tables'][name]
+    path = os.path.join(os.path.dirname(os.path.abspath(manifest_path)), entry['path'])
+    if entry['format'] == 'parquet':
+        return pd.read_parquet(path)
+    frame = pd.read_json(path, orient='records', lines=True, dtype=False) if entry['rows'] else pd.DataFrame(columns=list(entry['columns']))
+    return frame.astype(entry['columns'])
+
+def export_analysis_results(analyzer, output_path="analysis_results.json", table_format='ndjson', batch_rows=EXPORT_BATCH_ROWS):
+    """Write every result table to its own file next to a small JSON manifest at ``output_path``.
+
+    Tables go to ``<output_path minus extension>/<name>.<ndjson|parquet>``;
+    the manifest lists them with row counts and dtypes and carries the
+    scalar results. It is written last, so a manifest only ever points at
+    complete tables.
+    """
+    if not analyzer.loaded: return False
+    if table_format not in EXPORT_FORMATS:
+        raise ValueError(f"table_format must be one of {EXPORT_FORMATS}")
     
-    results = {
-        'basic_metrics': analyzer.get_basic_metrics(),
-        'conversion_3d': analyzer.calculate_conversion_rates(3).to_dict('records'),
-        'conversion_7d': analyzer.calculate_conversion_rates(7).to_dict('records'),
-        'hourly_performance': analyzer.analyze_hourly_performance().to_dict('records'),
-        'coach_performance': analyzer.analyze_coach_performance(),
-        'funnel_performance': analyzer.analyze_funnel_performance().to_dict('records'),
-        'key_insights': analyzer.generate_key_insights(),
-        'recommendations': analyzer.generate_actionable_recommendations()
+    import json
+    import os
+    base = os.path.splitext(output_path)[0]
+    table_dir = os.path.basename(base)
+    os.makedirs(base, exist_ok=True)
+    
+    journeys = analyzer.analyze_user_journeys()
+    coach_performance = analyzer.analyze_coach_performance()
+    tables = {
+        'conversion_3d': lambda: analyzer.calculate_conversion_rates(3),
+        'conversion_7d': lambda: analyzer.calculate_conversion_rates(7),
+        'hourly_performance': analyzer.analyze_hourly_performance,
+        'coach_performance': lambda: coach_performance['individual_coaches'],
+        'class_performance': lambda: coach_performance['class_performance'],
+        'funnel_performance': analyzer.analyze_funnel_performance,
+        'first_touch': lambda: journeys['first_touch'],
+        'last_touch': lambda: journeys['last_touch'],
     }
+    manifest = {'format': table_format, 'tables': {}}
+    for name, build in tables.items():
+        path = os.path.join(table_dir, f"{name}.{table_format}")
+        entry = write_table(build(), os.path.join(os.path.dirname(base), path), table_format, batch_rows)
+        manifest['tables'][name] = {'path': path, 'format': table_format, **entry}
     
-    import json
-    with open(output_path, 'w') as f:
-        json.dump(results, f, indent=2, default=str)
+    manifest.update({
+        'basic_metrics': analyzer.get_basic_metrics(),
+        'user_journeys': journeys['summary'],
+        'key_insights': analyzer.generate_key_insights(),
+        'recommendations': analyzer.generate_actionable_recommendations(),
+        'quality': os.path.basename(base) + '_quality.json',
+    })
+    with open(base + '_quality.json', 'w') as f:
+        json.dump(analyzer.get_data_quality(), f, indent=2)
+    with open(output_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, default=_json_default)
+    os.replace(output_path + '.tmp', output_path)
     return True
 
 def create_summary_report(analyzer):
@@ -209,4 +305,4 @@ if __name__ == "__main__":
         recommendations = analyzer.generate_actionable_recommendations()
         export_analysis_results(analyzer)
     else:
-        print("Error loading data.")
\ No newline at end of file
+        print(f"Error loading data: {analyzer.load_error}")
\ No newline at end of file
@@ -0,0 +1,510 @@
+import copy
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from iScale_Features import CONSULTATION_KEY, DATETIME_COLUMNS, KNOWN_VALUES, ensure_features
+from iScale_Journey import JOURNEY_COLUMNS, build_user_journeys
+
+# measure name -> (source column, pandas aggregation). Every analysis is
+# expressed through these, so each backend only has to implement them once.
+MEASURES = {
+    'consultations': ('user_id', 'count'),
+    'conversions': ('conversion_flag', 'sum'),
+    'connected': ('connectivity_flag', 'sum'),
+    'completed': ('completed_flag', 'sum'),
+    'conversions_within': ('conversion_days', 'sum'),
+}
+
+# Group-bys whose key space (product of key cardinalities) fits in this many
+# cells are counted with np.bincount into dense arrays instead of hashing.
+BINCOUNT_MAX_CELLS = 1 << 20
+
+
+def _is_parquet(file_path):
+    return str(file_path).lower().endswith(('.parquet', '.pq'))
+
+
+def _as_values(values):
+    return list(values) if isinstance(values, (list, tuple, set, frozenset)) else [values]
+
+
+class PandasBackend:
+    name = 'pandas'
+
+    def __init__(self, **read_options):
+        self.read_options = read_options
+        self.df = None
+        self.quality = None
+        self._codes = {}
+        self._cells_cache = {}
+
+    @property
+    def loaded(self):
+        return self.df is not None
+
+    def load(self, file_path):
+        if _is_parquet(file_path):
+            self.prepare(pd.read_parquet(file_path))
+        else:
+            self.prepare(pd.read_csv(file_path, **self.read_options))
+
+    def prepare(self, df):
+        """Adopt a freshly read frame: parse timestamps and build the quality report."""
+        self.df = df
+        self._codes = {}
+        self._cells_cache = {}
+
+        # Quality counts reuse the timestamp parse; on top of it they cost a
+        # null scan per column and one hash of the key columns, in memory.
+        nulls = self.df.isna().sum()
+        coerced = {}
+        for col in DATETIME_COLUMNS:
+            parsed = pd.to_datetime(self.df[col], errors='coerce')
+            coerced[col] = int(parsed.isna().sum() - nulls[col])
+            nulls[col] += coerced[col]
+            self.df[col] = parsed
+
+        unknown = {}
+        for col, known in KNOWN_VALUES.items():
+            if col in self.df.columns:
+                counts = self.df[col].value_counts()
+                counts = counts[~counts.index.isin(known)]
+                unknown[col] = {str(value): int(count) for value, count in counts.items()}
+
+        key = [col for col in CONSULTATION_KEY if col in self.df.columns]
+        self.quality = quality_report(
+            rows=len(self.df),
+            nulls=nulls,
+            coerced=coerced,
+            unknown=unknown,
+            negative_lags=(self.df['payment_time'] < self.df['slot_start_time']).sum(),
+            duplicates=self.df.duplicated(subset=key).sum() if key else 0
+        )
+
+    def require(self, *features):
+        return ensure_features(self.df, features)
+
+    def user_journeys(self):
+        return build_user_journeys(self.columns(JOURNEY_COLUMNS))
+
+    def subset(self, filters):
+        """Backend over the rows whose columns take one of the given values."""
+        mask = np.ones(len(self.df), dtype=bool)
+        for column, values in filters.items():
+            mask &= self.require(column)[column].isin(_as_values(values)).to_numpy()
+        subset = PandasBackend(**self.read_options)
+        subset.df = self.df[mask].reset_index(drop=True)
+        return subset
+
+    def memory_bytes(self):
+        if self.df is None:
+            return 0
+        cached = sum(codes.nbytes for codes, _ in self._codes.values())
+        cached += sum(cells.nbytes for cells in self._cells_cache.values())
+        return int(self.df.memory_usage(deep=True).sum()) + cached
+
+    def columns(self, names):
+        return self.require(*names)[list(names)]
+
+    def row_count(self):
+        return len(self.df)
+
+    def distinct_count(self, column):
+        return self.require(column)[column].nunique()
+
+    def _measure_values(self, measure, within_days):
+        column, _ = MEASURES[measure]
+        values = self.require(column)[column]
+        if measure == 'conversions_within':
+            values = ((values >= 0) & (values <= within_days)).fillna(False).astype('int8')
+        return values
+
+    def _measure_mask(self, measure, within_days):
+        values = self._measure_values(measure, within_days)
+        if MEASURES[measure][1] == 'count':
+            return values.notna().to_numpy()
+        return values.to_numpy(dtype='int8') != 0
+
+    def _key_codes(self, key):
+        if key not in self._codes:
+            values = self.require(key)[key]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+            else:
+                codes, uniques = pd.factorize(values, sort=True)
+            if len(uniques) > BINCOUNT_MAX_CELLS:
+                return None
+            self._codes[key] = (codes.astype(np.min_scalar_type(-len(uniques))), uniques)
+        return self._codes[key]
+
+    def totals(self, measures, within_days=None):
+        totals = {}
+        for measure in measures:
+            values = self._measure_values(measure, within_days)
+            totals[measure] = values.count() if MEASURES[measure][1] == 'count' else values.sum()
+        return totals
+
+    def aggregate(self, keys, measures, within_days=None):
+        encoded = [self._key_codes(key) for key in keys]
+        if all(e is not None for e in encoded):
+            shape = tuple(len(uniques) for _, uniques in encoded)
+            if 0 < np.prod(shape, dtype=np.float64) <= BINCOUNT_MAX_CELLS:
+                return self._bincount_aggregate(keys, encoded, shape, measures, within_days)
+        return self._groupby_aggregate(keys, measures, within_days)
+
+    def _cells(self, keys, encoded, shape):
+        # Row -> flat cell index over the dense key space; rows with a null
+        # key land in one extra overflow cell that is dropped afterwards.
+        cache_key = tuple(keys)
+        if cache_key not in self._cells_cache:
+            size = int(np.prod(shape))
+            cells = np.zeros(len(self.df), dtype=np.int64)
+            missing = np.zeros(len(self.df), dtype=bool)
+            for (codes, _), stride in zip(encoded, np.cumprod((1,) + shape[:0:-1])[::-1]):
+                cells += codes.astype(np.int64) * int(stride)
+                missing |= codes < 0
+            cells[missing] = size
+            self._cells_cache[cache_key] = cells.astype(np.min_scalar_type(size))
+        return self._cells_cache[cache_key]
+
+    def _bincount_aggregate(self, keys, encoded, shape, measures, within_days):
+        size = int(np.prod(shape))
+        cells = self._cells(keys, encoded, shape).astype(np.intp)
+
+        present = np.flatnonzero(np.bincount(cells, minlength=size + 1)[:size])
+        positions = np.unravel_index(present, shape)
+        result = pd.DataFrame({
+            key: (pd.Categorical.from_codes(pos, dtype=self.df[key].dtype)
+                  if isinstance(self.df[key].dtype, pd.CategoricalDtype) else uniques.take(pos))
+            for key, (_, uniques), pos in zip(keys, encoded, positions)
+        })
+        for measure in measures:
+            counts = np.bincount(cells, weights=self._measure_mask(measure, within_days), minlength=size + 1)
+            result[measure] = counts[present].astype(np.int64)
+        return result
+
+    def _groupby_aggregate(self, keys, measures, within_days):
+        df = self.require(*keys)
+        frame = pd.DataFrame({key: df[key] for key in keys})
+        for measure in measures:
+            frame[measure] = self._measure_values(measure, within_days)
+        return frame.groupby(list(keys), observed=True).agg(
+            **{measure: (measure, MEASURES[measure][1]) for measure in measures}
+        ).reset_index()
+
+
+class DuckDBBackend:
+    """Runs the same aggregates inside DuckDB, straight from the CSV/Parquet file.
+
+    DuckDB executes multi-threaded and spills to ``temp_directory`` once
+    ``memory_limit`` is reached, so frames larger than RAM still work.
+    """
+    name = 'duckdb'
+
+    def __init__(self, threads=None, memory_limit=None, temp_directory=None):
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("The 'duckdb' backend requires the duckdb package (pip install duckdb)") from e
+        self.con = duckdb.connect()
+        if threads:
+            self.con.execute(f"SET threads = {int(threads)}")
+        if memory_limit:
+            self.con.execute(f"SET memory_limit = '{memory_limit}'")
+        if temp_directory:
+            self.con.execute(f"SET temp_directory = '{temp_directory}'")
+        self.df = None
+        self.quality = None
+        self.loaded = False
+        self.relation = 'consultations'
+
+    @staticmethod
+    def _quote(name):
+        return '"' + str(name).replace('"', '""') + '"'
+
+    def _source(self, file_path):
+        path = str(file_path).replace("'", "''")
+        if _is_parquet(file_path):
+            return f"read_parquet('{path}')"
+        types = ', '.join(f"'{col}': 'VARCHAR'" for col in DATETIME_COLUMNS)
+        return f"read_csv('{path}', header = true, types = {{{types}}})"
+
+    def load(self, file_path):
+        q = self._quote
+        source = self._source(file_path)
+        # Describing the source only sniffs a sample (or reads Parquet metadata)
+        schema = dict(self.con.execute(f"SELECT column_name, column_type FROM (DESCRIBE SELECT * FROM {source})").fetchall())
+        counts = self._materialize(source, schema)
+
+        derived = {
+            'conversion_flag': "CAST(payment_time IS NOT NULL AS TINYINT)",
+            'connectivity_flag': "CAST(coalesce(booked_flag = 'Booked', false) AS TINYINT)",
+            'completed_flag': "CAST(coalesce(current_status = 'Done', false) AS TINYINT)",
+            'handled_hour': "CAST(hour(handled_time) AS TINYINT)",
+            'slot_hour': "CAST(hour(slot_start_time) AS TINYINT)",
+            'slot_month': "strftime(slot_start_time, '%Y-%m')",
+            'conversion_days': "CAST(floor((epoch_us(payment_time) - epoch_us(slot_start_time)) / 86400000000.0) AS INTEGER)",
+        }
+        sources = {'connectivity_flag': 'booked_flag', 'completed_flag': 'current_status'}
+        derived = {name: expr for name, expr in derived.items() if sources.get(name, 'user_id') in schema}
+
+        if 'India vs NRI' in schema and 'medicalconditionflag' in schema:
+            flag = q('medicalconditionflag')
+            if schema['medicalconditionflag'] == 'BOOLEAN':
+                medical = f"CASE WHEN {flag} THEN 'Medical' WHEN NOT {flag} THEN 'NonMedical' END"
+            else:
+                medical = f"CASE {flag} WHEN 'Yes' THEN 'Medical' WHEN 'No' THEN 'NonMedical' END"
+            derived['lead_type'] = f"CAST({q('India vs NRI')} AS VARCHAR) || '_' || ({medical})"
+
+        columns = ', '.join(f"{expr} AS {q(name)}" for name, expr in derived.items())
+        self.con.execute(f"CREATE OR REPLACE VIEW consultations AS SELECT *, {columns} FROM raw_consultations")
+        self.quality = self._quality(schema, counts)
+        self.loaded = True
+
+    def _materialize(self, source, schema):
+        """Load ``source`` into raw_consultations with parsed timestamps; returns the quality counts.
+
+        The file is read once, into a materialized CTE. One UNION both
+        stores its rows and appends a single extra row whose struct column
+        holds every quality count, aggregated over that same CTE; the extra
+        row and column are then dropped. Queries read the parsed timestamps
+        from the table instead of casting them again each time.
+        """
+        q = self._quote
+        raw = {col: q(f'__raw_{col}') for col in DATETIME_COLUMNS}
+        parsed = ', '.join(f"TRY_CAST({q(col)} AS TIMESTAMP) AS {q(col)}" for col in DATETIME_COLUMNS)
+        kept = ', '.join(f"{q(col)} AS {alias}" for col, alias in raw.items())
+
+        checks = {f'nulls:{col}': f"COUNT(*) - COUNT({raw.get(col, q(col))})" for col in schema}
+        for col in DATETIME_COLUMNS:
+            checks[f'coerced:{col}'] = f"COUNT({raw[col]}) - COUNT({q(col)})"
+        checks['negative_lags'] = "COUNT(*) FILTER (WHERE payment_time < slot_start_time)"
+        # Keys compare parsed timestamps, and DISTINCT on a row value treats
+        # NULL fields as equal, both as pandas' duplicated does
+        key = [q(col) for col in CONSULTATION_KEY if col in schema]
+        checks['duplicates'] = f"COUNT(*) - COUNT(DISTINCT row({', '.join(key)}))" if key else "0"
+        for col in KNOWN_VALUES:
+            if col in schema and schema[col] != 'BOOLEAN':
+                allowed = ', '.join("'" + value + "'" for value in KNOWN_VALUES[col] if isinstance(value, str))
+                checks[f'unknown:{col}'] = (
+                    f"histogram(CAST({q(col)} AS VARCHAR)) FILTER (WHERE CAST({q(col)} AS VARCHAR) NOT IN ({allowed}))"
+                )
+        fields = ', '.join(f"'{name.replace(chr(39), chr(39) * 2)}': {expr}" for name, expr in checks.items())
+
+        self.con.execute(f"""
+            CREATE OR REPLACE TABLE raw_consultations AS
+            WITH source AS MATERIALIZED (SELECT * REPLACE ({parsed}), {kept} FROM {source})
+            SELECT * EXCLUDE ({', '.join(raw.values())}) FROM source
+            UNION ALL BY NAME
+            SELECT {{'_rows': COUNT(*), {fields}}} AS __quality FROM source
+        """)
+        counts = self.con.execute("SELECT __quality FROM raw_consultations WHERE __quality IS NOT NULL").fetchone()[0]
+        self.con.execute("DELETE FROM raw_consultations WHERE __quality IS NOT NULL")
+        self.con.execute("ALTER TABLE raw_consultations DROP COLUMN __quality")
+        return counts
+
+    def _quality(self, schema, counts):
+        coerced = {col: int(counts[f'coerced:{col}']) for col in DATETIME_COLUMNS}
+        nulls = {col: int(counts[f'nulls:{col}']) + coerced.get(col, 0) for col in schema}
+        unknown = {
+            col: dict(sorted(((str(value), int(count)) for value, count in (counts.get(f'unknown:{col}') or {}).items()),
+                             key=lambda item: -item[1]))
+            for col in KNOWN_VALUES if col in schema
+        }
+        return quality_report(counts['_rows'], nulls, coerced, unknown, counts['negative_lags'], counts['duplicates'])
+
+    def user_journeys(self):
+        return build_user_journeys(self.columns(JOURNEY_COLUMNS))
+
+    @staticmethod
+    def _literal(value):
+        if isinstance(value, str):
+            return "'" + value.replace("'", "''") + "'"
+        if isinstance(value, (bool, np.bool_)):
+            return 'true' if value else 'false'
+        if isinstance(value, (int, float, np.integer, np.floating)):
+            return repr(value.item() if hasattr(value, 'item') else value)
+        raise TypeError(f"Unsupported filter value: {value!r}")
+
+    def subset(self, filters):
+        """Backend over the rows whose columns take one of the given values.
+
+        The filter is kept as a subquery that every query selects from, so
+        subsets leave nothing behind in the connection.
+        """
+        where = ' AND '.join(
+            f"{self._quote(column)} IN ({', '.join(map(self._literal, _as_values(values)))})"
+            for column, values in filters.items()
+        ) or 'true'
+        subset = copy.copy(self)
+        subset.relation = f"(SELECT * FROM {self.relation} WHERE {where})"
+        subset.quality = None
+        return subset
+
+    def memory_bytes(self):
+        return int(self.con.execute("SELECT SUM(memory_usage_bytes) FROM duckdb_memory()").fetchone()[0] or 0)
+
+    def require(self, *features):
+        raise NotImplementedError("The duckdb backend does not materialize a row-level frame; use columns() instead")
+
+    def columns(self, names):
+        return self.con.execute(f"SELECT {', '.join(map(self._quote, names))} FROM {self.relation}").df()
+
+    def row_count(self):
+        return self.con.execute(f"SELECT COUNT(*) FROM {self.relation}").fetchone()[0]
+
+    def distinct_count(self, column):
+        return self.con.execute(f"SELECT COUNT(DISTINCT {self._quote(column)}) FROM {self.relation}").fetchone()[0]
+
+    def _measure_sql(self, measure, within_days):
+        column, how = MEASURES[measure]
+        if measure == 'conversions_within':
+            return f"CAST(SUM(CASE WHEN conversion_days BETWEEN 0 AND {int(within_days)} THEN 1 ELSE 0 END) AS BIGINT)"
+        if how == 'count':
+            return f"COUNT({self._quote(column)})"
+        return f"CAST(COALESCE(SUM({self._quote(column)}), 0) AS BIGINT)"
+
+    def totals(self, measures, within_days=None):
+        select = ', '.join(self._measure_sql(m, within_days) for m in measures)
+        return dict(zip(measures, self.con.execute(f"SELECT {select} FROM {self.relation}").fetchone()))
+
+    def aggregate(self, keys, measures, within_days=None):
+        quoted = ', '.join(map(self._quote, keys))
+        select = ', '.join(f"{self._measure_sql(m, within_days)} AS {m}" for m in measures)
+        not_null = ' AND '.join(f"{self._quote(k)} IS NOT NULL" for k in keys)
+        return self.con.execute(f"""
+            SELECT {quoted}, {select} FROM {self.relation}
+            WHERE {not_null} GROUP BY {quoted} ORDER BY {quoted}
+        """).df()
+
+
+def quality_report(rows, nulls, coerced, unknown, negative_lags, duplicates):
+    return {
+        'rows': int(rows),
+        'null_counts': {str(col): int(count) for col, count in dict(nulls).items()},
+        'coerced_to_null': {col: int(count) for col, count in coerced.items()},
+        'unknown_values': unknown,
+        'negative_conversion_lags': int(negative_lags),
+        'duplicate_consultations': int(duplicates),
+    }
+
+
+def quality_issues(report):
+    """Human-readable lines for every non-zero count in a quality report."""
+    issues = [f"{count:,} unparseable values in {col}" for col, count in report['coerced_to_null'].items() if count]
+    for col, values in report['unknown_values'].items():
+        if values:
+            listed = ', '.join(f"{value!r} x{count:,}" for value, count in values.items())
+            issues.append(f"{sum(values.values()):,} unknown values in {col} ({listed})")
+    if report['negative_conversion_lags']:
+        issues.append(f"{report['negative_conversion_lags']:,} payments recorded before their slot")
+    if report['duplicate_consultations']:
+        issues.append(f"{report['duplicate_consultations']:,} duplicate consultations")
+    return issues
+
+
+def _parallel_backend(**options):
+    from iScale_Parallel import ParallelBackend
+    return ParallelBackend(**options)
+
+
+BACKENDS = {
+    'pandas': PandasBackend,
+    'duckdb': DuckDBBackend,
+    'parallel': _parallel_backend,
+}
+
+
+def get_backend(backend='pandas', **options):
+    if not isinstance(backend, str):
+        return backend
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+    return BACKENDS[backend](**options)
+
+
+def _compare(expected, actual, path, mismatches):
+    if isinstance(expected, pd.DataFrame):
+        try:
+            pd.testing.assert_frame_equal(expected.reset_index(drop=True).astype({c: object for c in expected.select_dtypes('category')}),
+                                          actual.reset_index(drop=True).astype({c: object for c in actual.select_dtypes('category')}),
+                                          check_dtype=False, check_column_type=False, check_index_type=False)
+        except AssertionError as e:
+            mismatches.append(f"{path}: {str(e).splitlines()[0]}")
+    elif isinstance(expected, dict):
+        for key in set(expected) | set(actual):
+            if key not in expected or key not in actual:
+                mismatches.append(f"{path}.{key}: missing on one backend")
+            else:
+                _compare(expected[key], actual[key], f"{path}.{key}", mismatches)
+    elif isinstance(expected, (list, tuple)):
+        if len(expected) != len(actual):
+            mismatches.append(f"{path}: {expected!r} != {actual!r}")
+        for i, (e, a) in enumerate(zip(expected, actual)):
+            _compare(e, a, f"{path}[{i}]", mismatches)
+    elif expected != actual and not (pd.isna(expected) and pd.isna(actual)):
+        mismatches.append(f"{path}: {expected!r} != {actual!r}")
+
+
+# Analysis name -> (analyzer method, args) for every parity check; each
+# analyzer class runs the ones it has.
+PARITY_ANALYSES = {
+    'basic_metrics': ('get_basic_metrics', ()),
+    'conversion_3d': ('calculate_conversion_rates', (3,)),
+    'conversion_7d': ('calculate_conversion_rates', (7,)),
+    'hourly': ('analyze_hourly_performance', ()),
+    'coach': ('analyze_coach_performance', ()),
+    'class': ('analyze_class_performance', ()),
+    'funnel': ('analyze_funnel_performance', ()),
+    'journeys': ('analyze_user_journeys', ()),
+    'insights': ('generate_key_insights', ()),
+    'key_insights': ('get_key_insights', ()),
+    'recommendations': ('generate_actionable_recommendations', ()),
+    'quality': ('get_data_quality', ()),
+}
+
+
+def parity_analyses(analyzer_cls):
+    return {name: call for name, call in PARITY_ANALYSES.items() if hasattr(analyzer_cls, call[0])}
+
+
+def verify_backend_parity(analyzer_cls, file_path, analyses=None, backends=('pandas', 'duckdb')):
+    """Run ``analyses`` (name -> (method, args), PARITY_ANALYSES by default) on each backend and list every difference."""
+    analyses = analyses or parity_analyses(analyzer_cls)
+    results = {}
+    for backend in backends:
+        analyzer = analyzer_cls(file_path, backend=backend)
+        if not analyzer.load_and_process_data():
+            raise RuntimeError(f"Could not load {file_path} with the {backend} backend")
+        results[backend] = {name: getattr(analyzer, method)(*args) for name, (method, args) in analyses.items()}
+
+    reference, *others = backends
+    mismatches = []
+    for backend in others:
+        _compare(results[reference], results[backend], backend, mismatches)
+    return mismatches
+
+
+def main(file_path):
+    from iScale_DA import iScaleDataAnalyzer
+    from iScale_Analysis_clean import iScaleAnalyzer
+
+    failed = False
+    for analyzer_cls in [iScaleDataAnalyzer, iScaleAnalyzer]:
+        mismatches = verify_backend_parity(analyzer_cls, file_path)
+        if mismatches:
+            failed = True
+            print(f"❌ {analyzer_cls.__name__}: {len(mismatches)} mismatches")
+            for mismatch in mismatches:
+                print(f"   {mismatch}")
+        else:
+            print(f"✅ {analyzer_cls.__name__}: all backends agree")
+    return not failed
+
+
+if __name__ == "__main__":
+    default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'iScale_MaskedData.csv')
+    sys.exit(0 if main(sys.argv[1] if len(sys.argv) > 1 else default_path) else 1)
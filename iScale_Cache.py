@@ -0,0 +1,365 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from iScale_Backend import _as_values
+
+
+class AnalyzerCache:
+    """Loaded analyzers keyed by dataset, bounded by their total memory.
+
+    Entries are kept in least-recently-used order. When a new entry pushes
+    the total over ``max_bytes``, the oldest entries are dropped until it
+    fits again; the newest entry is always kept, even if it alone is over
+    the budget. Sizes are re-measured on every hit because analyzers grow
+    as they cache derived columns and journeys.
+    """
+
+    def __init__(self, loader, max_bytes, sizeof=None):
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda analyzer: analyzer.memory_bytes())
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Streamlit serves sessions from several threads.
+        self._lock = threading.RLock()
+        self._loaded = threading.Condition(self._lock)
+        self._loading = set()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def total_bytes(self):
+        return sum(self.sizes.values())
+
+    def get(self, key, *args, **kwargs):
+        """Cached analyzer for ``key``, loading it with ``loader(*args, **kwargs)`` on a miss.
+
+        Loading happens outside the lock so hits on other datasets stay
+        instant; concurrent misses on the same key wait for one load.
+        """
+        with self._lock:
+            while key in self._loading:
+                self._loaded.wait()
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                self.sizes[key] = self.sizeof(self.entries[key])
+                self._evict()
+                return self.entries[key]
+            self.misses += 1
+            self._loading.add(key)
+
+        analyzer = None
+        try:
+            analyzer = self.loader(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._loading.discard(key)
+                if analyzer is not None:
+                    self.entries[key] = analyzer
+                    self.sizes[key] = self.sizeof(analyzer)
+                    self._evict()
+                self._loaded.notify_all()
+        return analyzer
+
+    def _evict(self):
+        while len(self.entries) > 1 and self.total_bytes > self.max_bytes:
+            key, _ = self.entries.popitem(last=False)
+            del self.sizes[key]
+            self.evictions += 1
+
+    def discard(self, key):
+        with self._lock:
+            self.entries.pop(key, None)
+            self.sizes.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self.entries),
+                'total_bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+def data_version(file_path, backend_name):
+    """Identity of a dataset's contents as loaded by one backend; a rewritten file gets a new version."""
+    stat = os.stat(file_path)
+    return (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size, backend_name)
+
+
+def normalize_filters(filters):
+    """Hashable, order-independent form of {column: value or values}; empty selections mean no filter."""
+    normalized = []
+    for column, values in dict(filters).items():
+        values = {value.item() if isinstance(value, np.generic) else value for value in _as_values(values)}
+        if values:
+            normalized.append((column, tuple(sorted(values, key=repr))))
+    return tuple(sorted(normalized))
+
+
+def _sizeof(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum())
+    return sys.getsizeof(value)
+
+
+class _Result:
+    __slots__ = ('value', 'complete')
+
+    def __init__(self, value, complete=False):
+        self.value = value
+        # Aggregates only: the measure sums equal the totals over the
+        # filtered rows, i.e. no row with a null key carried any counts.
+        self.complete = complete
+
+
+class QueryCache:
+    """Query results keyed by (data version, filters, query), bounded by their total memory.
+
+    Aggregates are also answered from cached finer ones: a result grouped
+    by more keys, or filtered less, is filtered and re-summed (every
+    measure is a count). A miss on a filtered aggregate runs one unfiltered
+    query grouped by the filter columns as well, so every other selection
+    on those columns is then derived from it without touching the data.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.hits = 0
+        self.derived = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def total_bytes(self):
+        return sum(self.sizes.values())
+
+    def _lookup(self, key):
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+        return None
+
+    def _store(self, key, result):
+        with self._lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            self.sizes[key] = _sizeof(result.value)
+            while len(self.entries) > 1 and self.total_bytes > self.max_bytes:
+                oldest, _ = self.entries.popitem(last=False)
+                del self.sizes[oldest]
+                self.evictions += 1
+        return result
+
+    def get(self, key, compute):
+        """Cached value for ``key``, computed with ``compute()`` on a miss."""
+        result = self._lookup(key)
+        if result is not None:
+            self.hits += 1
+            return result.value
+        self.misses += 1
+        return self._store(key, _Result(compute())).value
+
+    def aggregate(self, version, backend, keys, measures, within_days=None, filters=()):
+        """``backend.aggregate`` over the rows matching ``filters`` (normalized), from cache when possible."""
+        keys, measures = list(keys), list(measures)
+        within_days = within_days if 'conversions_within' in measures else None
+        key = (version, filters, ('aggregate', tuple(keys), tuple(measures), within_days))
+        result = self._lookup(key)
+        if result is not None:
+            self.hits += 1
+            return result.value
+
+        source = self._finest_source(version, keys, measures, within_days, filters)
+        if source is not None:
+            self.derived += 1
+            (_, source_filters, (_, source_keys, _, _)), source = source
+        else:
+            self.misses += 1
+            source_keys = keys + [column for column, _ in filters if column not in keys]
+            frame = backend.aggregate(source_keys, measures, within_days)
+            totals = self.get((version, (), ('totals', tuple(measures), within_days)),
+                              lambda: backend.totals(measures, within_days))
+            complete = all(frame[m].sum() == totals[m] for m in measures)
+            source_filters, source_keys = (), tuple(source_keys)
+            source = self._store((version, (), ('aggregate', source_keys, tuple(measures), within_days)),
+                                 _Result(frame, complete))
+            if not filters and list(source_keys) == keys:
+                return frame
+
+        remaining = [(column, values) for column, values in filters if (column, values) not in source_filters]
+        if not remaining and list(source_keys) == keys:
+            frame = source.value[keys + measures]
+        else:
+            frame = source.value
+            mask = np.ones(len(frame), dtype=bool)
+            for column, values in remaining:
+                mask &= frame[column].isin(values).to_numpy()
+            frame = frame[mask].groupby(keys, observed=True, sort=True)[measures].sum().reset_index()
+        return self._store(key, _Result(frame, source.complete)).value
+
+    def _finest_source(self, version, keys, measures, within_days, filters):
+        """Smallest cached aggregate that the requested one can be exactly derived from."""
+        wanted = dict(filters)
+        candidates = []
+        with self._lock:
+            for key, result in self.entries.items():
+                entry_version, entry_filters, query = key
+                if entry_version != version or query[0] != 'aggregate':
+                    continue
+                _, entry_keys, entry_measures, entry_within = query
+                if entry_within != within_days or not set(measures) <= set(entry_measures):
+                    continue
+                if not set(keys) <= set(entry_keys):
+                    continue
+                entry_filters = dict(entry_filters)
+                # Each of the entry's filters must be kept or narrowed, and
+                # every column filtered further must still be in its keys.
+                if not all(column in wanted and set(wanted[column]) <= set(values)
+                           for column, values in entry_filters.items()):
+                    continue
+                narrowed = {column for column, values in wanted.items() if entry_filters.get(column) != values}
+                if not narrowed <= set(entry_keys):
+                    continue
+                # Re-summing over a key drops nothing only if no counted row
+                # had it null, or if the rows left are filtered on it anyway.
+                if not result.complete and not set(entry_keys) - set(keys) <= narrowed:
+                    continue
+                candidates.append((len(result.value), key, result))
+        if not candidates:
+            return None
+        _, key, result = min(candidates, key=lambda candidate: candidate[0])
+        return key, result
+
+    def discard_version(self, version):
+        with self._lock:
+            for key in [key for key in self.entries if key[0] == version]:
+                del self.entries[key]
+                del self.sizes[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self.entries),
+                'total_bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'derived': self.derived,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class CachedBackend:
+    """Backend wrapper that answers queries through a shared QueryCache.
+
+    ``subset`` only records the filters: aggregates and totals over a slice
+    are derived from cached unfiltered results, and the filtered rows are
+    materialized on the wrapped backend only for row counts, distinct
+    counts and journeys, whose results are cached in turn.
+    """
+
+    def __init__(self, backend, cache, version=None, filters=()):
+        self.backend = backend
+        self.cache = cache
+        self.version = version
+        self.filters = filters
+        self._view = None
+
+    @property
+    def name(self):
+        return self.backend.name
+
+    @property
+    def loaded(self):
+        return self.backend.loaded
+
+    @property
+    def df(self):
+        return self.view.df
+
+    @property
+    def quality(self):
+        # The ingestion report describes the loaded extract; no backend
+        # keeps one for a subset, so don't materialize the view to find out
+        return None if self.filters else self.backend.quality
+
+    @property
+    def view(self):
+        """The wrapped backend restricted to the filtered rows."""
+        if not self.filters:
+            return self.backend
+        if self._view is None:
+            self._view = self.backend.subset({column: list(values) for column, values in self.filters})
+        return self._view
+
+    def load(self, file_path):
+        self.backend.load(file_path)
+        self.version = data_version(file_path, self.backend.name)
+        self.filters = ()
+        self._view = None
+
+    def _cached(self, query, compute):
+        return self.cache.get((self.version, self.filters, query), compute)
+
+    def subset(self, filters):
+        merged = dict(self.filters)
+        for column, values in normalize_filters(filters):
+            if column in merged:
+                values = tuple(value for value in values if value in merged[column])
+            merged[column] = values
+        return CachedBackend(self.backend, self.cache, self.version, tuple(sorted(merged.items())))
+
+    def aggregate(self, keys, measures, within_days=None):
+        return self.cache.aggregate(self.version, self.backend, keys, measures, within_days, self.filters)
+
+    def totals(self, measures, within_days=None):
+        if not self.filters:
+            return self._cached(('totals', tuple(measures), within_days), lambda: self.backend.totals(measures, within_days))
+        # Filtered rows never have a null filter column, so this is exact
+        frame = self.aggregate([column for column, _ in self.filters], measures, within_days)
+        return {measure: frame[measure].sum() for measure in measures}
+
+    def row_count(self):
+        return self._cached(('row_count',), lambda: self.view.row_count())
+
+    def distinct_count(self, column):
+        return self._cached(('distinct_count', column), lambda: self.view.distinct_count(column))
+
+    def user_journeys(self):
+        return self._cached(('user_journeys',), lambda: self.view.user_journeys())
+
+    def require(self, *features):
+        return self.view.require(*features)
+
+    def columns(self, names):
+        return self.view.columns(names)
+
+    def memory_bytes(self):
+        return self.backend.memory_bytes() + (self._view.memory_bytes() if self._view is not None else 0)
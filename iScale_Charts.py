@@ -0,0 +1,169 @@
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from iScale_Simulator import SEGMENT_KEYS, SlotPolicySimulator
+
+# Chart figures shared by the dashboard and the static report renderer.
+# Builders only take prepared frames/values, so they can run in worker
+# processes that never load the consultation data themselves.
+
+PEAK_SHARE = 0.7
+PEAK_HOURS = 3
+SIMULATION_DRAWS = 500
+
+
+def funnel_distribution_chart(funnel_counts):
+    return px.pie(values=funnel_counts['user_id'], names=funnel_counts['funnel'],
+                  title="Distribution by Funnel")
+
+
+def lead_type_distribution_chart(lead_counts):
+    return px.pie(values=lead_counts['user_id'], names=lead_counts['lead_type'].astype(str),
+                  title="Distribution by Lead Type")
+
+
+def conversion_rates_chart(conversion_summary):
+    fig = make_subplots(
+        rows=1, cols=2,
+        subplot_titles=('3-Day Conversion Rate', '7-Day Conversion Rate')
+    )
+    segment_label = conversion_summary['funnel'] + ' - ' + conversion_summary['lead_type'].astype(str)
+    fig.add_trace(
+        go.Bar(x=segment_label, y=conversion_summary['conversion_rate_3d'],
+               name='3-Day Rate', marker_color='lightblue'),
+        row=1, col=1
+    )
+    fig.add_trace(
+        go.Bar(x=segment_label, y=conversion_summary['conversion_rate_7d'],
+               name='7-Day Rate', marker_color='lightgreen'),
+        row=1, col=2
+    )
+    fig.update_layout(height=500, title="Conversion Rates Comparison", showlegend=False)
+    fig.update_xaxes(tickangle=45)
+    return fig
+
+
+def hourly_performance_chart(hourly_stats):
+    fig = make_subplots(
+        rows=2, cols=1,
+        subplot_titles=('Connectivity Rate by Hour', 'Conversion Rate by Hour'),
+        vertical_spacing=0.1
+    )
+    fig.add_trace(
+        go.Scatter(x=hourly_stats['slot_hour'], y=hourly_stats['connectivity_rate'],
+                   mode='lines+markers', name='Connectivity Rate', line=dict(color='blue')),
+        row=1, col=1
+    )
+    fig.add_trace(
+        go.Scatter(x=hourly_stats['slot_hour'], y=hourly_stats['conversion_rate'],
+                   mode='lines+markers', name='Conversion Rate', line=dict(color='green')),
+        row=2, col=1
+    )
+    fig.update_xaxes(title_text="Hour of Day", row=2, col=1)
+    fig.update_yaxes(title_text="Connectivity Rate (%)", row=1, col=1)
+    fig.update_yaxes(title_text="Conversion Rate (%)", row=2, col=1)
+    fig.update_layout(height=600, title="Performance by Time of Day")
+    return fig
+
+
+def funnel_conversion_chart(funnel_performance):
+    return px.bar(funnel_performance, x='funnel', y='conversion_rate',
+                  title="Conversion Rate by Funnel", color='conversion_rate')
+
+
+def funnel_volume_chart(funnel_performance):
+    return px.bar(funnel_performance, x='funnel', y='user_id',
+                  title="Consultation Volume by Funnel", color='user_id')
+
+
+def class_performance_chart(class_stats):
+    fig = make_subplots(
+        rows=1, cols=2,
+        subplot_titles=('Conversion Rate by Coach Class', 'Connectivity Rate by Coach Class')
+    )
+    for col, metric in [(1, 'conversion_rate'), (2, 'connectivity_rate')]:
+        fig.add_trace(
+            go.Bar(x=class_stats['target_class'].astype(str), y=class_stats[metric],
+                   text=class_stats[metric].map('{:.1f}%'.format), textposition='outside',
+                   marker_color=px.colors.qualitative.Set2[:len(class_stats)]),
+            row=1, col=col
+        )
+        fig.update_xaxes(title_text="Coach Target Class", row=1, col=col)
+    fig.update_yaxes(title_text="Conversion Rate (%)", row=1, col=1)
+    fig.update_yaxes(title_text="Connectivity Rate (%)", row=1, col=2)
+    fig.update_layout(height=500, title="Coach Class Performance", showlegend=False)
+    return fig
+
+
+def peak_uplift_chart(uplift_draws, probability_better):
+    fig = px.histogram(x=uplift_draws, nbins=40,
+                       title=f"Additional Conversions ({probability_better:.0%} chance of improvement)")
+    fig.update_xaxes(title_text="Conversions vs current schedule")
+    return fig
+
+
+def peak_share_sweep_chart(sweep):
+    fig = go.Figure([
+        go.Scatter(x=sweep['policy'], y=sweep['conversions_p95'], mode='lines', line=dict(width=0), showlegend=False),
+        go.Scatter(x=sweep['policy'], y=sweep['conversions_p5'], mode='lines', line=dict(width=0),
+                   fill='tonexty', name='90% range'),
+        go.Scatter(x=sweep['policy'], y=sweep['conversions_mean'], mode='lines+markers', name='Expected'),
+    ])
+    fig.update_layout(title="Conversions by Peak-Hour Share", xaxis_title="Peak-hour share (%)",
+                      yaxis_title="Conversions")
+    return fig
+
+
+def peak_share_sweep(simulator, n_peak_hours=PEAK_HOURS, draws=SIMULATION_DRAWS):
+    shares = np.linspace(0, 1, 11)
+    return simulator.summarize(
+        simulator.simulate(simulator.peak_hour_policies(shares, n_peak_hours), draws),
+        labels=(shares * 100).round().astype(int)
+    )
+
+
+def _conversion_summary(analyzer):
+    conv_3d = analyzer.calculate_conversion_rates(3)
+    conv_7d = analyzer.calculate_conversion_rates(7)
+    return conv_3d.merge(conv_7d[['funnel', 'lead_type', 'conversion_rate_7d']], on=['funnel', 'lead_type'])
+
+
+def _simulator_inputs(analyzer):
+    # The seeded simulation is rebuilt from its own inputs when the figure is
+    # built, so the expensive draws run in the renderer's worker processes.
+    return {'hourly_stats': analyzer.analyze_hourly_performance(by=SEGMENT_KEYS)}
+
+
+def _peak_uplift_figure(hourly_stats):
+    simulator = SlotPolicySimulator(hourly_stats, seed=42)
+    _, uplift = simulator.compare_peak_share(PEAK_SHARE, PEAK_HOURS, draws=SIMULATION_DRAWS)
+    return peak_uplift_chart(uplift['uplift_draws'], uplift['probability_better'])
+
+
+def _peak_share_sweep_figure(hourly_stats):
+    return peak_share_sweep_chart(peak_share_sweep(SlotPolicySimulator(hourly_stats, seed=42)))
+
+
+# chart name -> (inputs from an analyzer, figure builder taking those inputs).
+# The *_analysis names match the PNGs shipped in the repo.
+CHARTS = {
+    'funnel_distribution': (lambda a: {'funnel_counts': a.analyze_distribution('funnel')}, funnel_distribution_chart),
+    'lead_type_distribution': (lambda a: {'lead_counts': a.analyze_distribution('lead_type')}, lead_type_distribution_chart),
+    'conversion_rates_analysis': (lambda a: {'conversion_summary': _conversion_summary(a)}, conversion_rates_chart),
+    'hourly_performance_analysis': (lambda a: {'hourly_stats': a.analyze_hourly_performance()}, hourly_performance_chart),
+    'funnel_conversion': (lambda a: {'funnel_performance': a.analyze_funnel_performance()}, funnel_conversion_chart),
+    'funnel_volume': (lambda a: {'funnel_performance': a.analyze_funnel_performance()}, funnel_volume_chart),
+    'coach_performance_analysis': (lambda a: {'class_stats': a.analyze_class_performance()}, class_performance_chart),
+    'peak_uplift': (_simulator_inputs, _peak_uplift_figure),
+    'peak_share_sweep': (_simulator_inputs, _peak_share_sweep_figure),
+}
+
+
+def chart_inputs(analyzer, name):
+    return CHARTS[name][0](analyzer)
+
+
+def build_chart(name, inputs):
+    return CHARTS[name][1](**inputs)
@@ -1,91 +1,164 @@
-import pandas as pd
 import os
+import copy
 import warnings
 import json
 from datetime import datetime
 
+from iScale_Backend import get_backend, quality_issues
+from iScale_Simulator import SlotPolicySimulator
+from iScale_Journey import journey_attribution, journey_summary
+
 warnings.filterwarnings('ignore')
 
 class iScaleDataAnalyzer:
-    def __init__(self, file_path):
+    def __init__(self, file_path, backend='pandas'):
         self.file_path = file_path
-        self.df = None
+        self.backend = get_backend(backend)
         self.analysis_results = {}
+        self.journeys = None
+        self.filters = {}
+        
+    @property
+    def df(self):
+        return self.backend.df
+        
+    @property
+    def loaded(self):
+        return self.backend.loaded
         
     def load_and_process_data(self):
         try:
-            self.df = pd.read_csv(self.file_path)
-            
-            datetime_cols = ['handled_time', 'slot_start_time', 'payment_time']
-            for col in datetime_cols:
-                self.df[col] = pd.to_datetime(self.df[col], errors='coerce')
-            
-            self.df['conversion_flag'] = (~self.df['payment_time'].isna()).astype(int)
-            self.df['handled_date'] = self.df['handled_time'].dt.date
-            self.df['handled_hour'] = self.df['handled_time'].dt.hour
-            self.df['slot_hour'] = self.df['slot_start_time'].dt.hour
-            self.df['payment_date'] = self.df['payment_time'].dt.date
+            self.journeys = None
+            self.backend.load(self.file_path)
             
-            self.df['conversion_days'] = (self.df['payment_time'] - self.df['slot_start_time']).dt.days
-            
-            self.df['lead_type'] = self.df['India vs NRI'] + '_' + self.df['medicalconditionflag'].map({
-                True: 'Medical', False: 'NonMedical', 'Yes': 'Medical', 'No': 'NonMedical'
-            })
-            
-            print(f"✅ Data loaded successfully: {len(self.df):,} records")
+            print(f"✅ Data loaded successfully: {self.backend.row_count():,} records")
+            for issue in quality_issues(self.backend.quality):
+                print(f"⚠️ Data quality: {issue}")
             return True
             
         except Exception as e:
             print(f"❌ Error loading data: {str(e)}")
             return False
     
+    def require(self, *features):
+        return self.backend.require(*features)
+    
+    def get_data_quality(self):
+        if not self.loaded:
+            return None
+        return self.backend.quality
+    
+    def subset(self, **filters):
+        """Analyzer over the rows matching ``filters`` (column=value or column=[values])"""
+        if not self.loaded:
+            return None
+            
+        analyzer = copy.copy(self)
+        analyzer.backend = self.backend.subset(filters)
+        analyzer.filters = {**self.filters, **filters}
+        analyzer.analysis_results = {}
+        analyzer.journeys = None
+        return analyzer
+    
+    def memory_bytes(self):
+        journeys = int(self.journeys.memory_usage(deep=True).sum()) if self.journeys is not None else 0
+        return self.backend.memory_bytes() + journeys
+    
     def calculate_conversion_rates(self, days):
-        if self.df is None:
+        if not self.loaded:
             return None
             
-        conversion_mask = (self.df['conversion_days'] <= days) & (self.df['conversion_days'] >= 0)
-        
-        conversion_stats = self.df.groupby(['funnel', 'lead_type']).agg({
-            'user_id': 'count',
-            'conversion_flag': 'sum'
-        }).reset_index()
-        
-        conversion_within_days = self.df[conversion_mask].groupby(['funnel', 'lead_type']).agg({
-            'conversion_flag': 'sum'
-        }).reset_index()
-        conversion_within_days.rename(columns={'conversion_flag': f'conversions_{days}d'}, inplace=True)
-        
-        result = conversion_stats.merge(conversion_within_days, on=['funnel', 'lead_type'], how='left')
-        result[f'conversions_{days}d'] = result[f'conversions_{days}d'].fillna(0)
+        result = self.backend.aggregate(
+            ['funnel', 'lead_type'], ['consultations', 'conversions', 'conversions_within'], within_days=days
+        ).rename(columns={
+            'consultations': 'user_id',
+            'conversions': 'conversion_flag',
+            'conversions_within': f'conversions_{days}d'
+        })
         result[f'conversion_rate_{days}d'] = (result[f'conversions_{days}d'] / result['user_id'] * 100).round(2)
         
         return result
     
-    def analyze_hourly_performance(self):
-        if self.df is None:
+    def analyze_hourly_performance(self, by=None):
+        if not self.loaded:
             return None
             
-        hourly_stats = self.df.groupby('slot_hour').agg({
-            'user_id': 'count',
-            'conversion_flag': 'sum',
-            'current_status': lambda x: (x == 'Done').sum()
-        }).reset_index()
+        hourly_stats = self.backend.aggregate(
+            list(by or []) + ['slot_hour'], ['consultations', 'conversions', 'completed']
+        ).rename(columns={'consultations': 'user_id', 'conversions': 'conversion_flag', 'completed': 'current_status'})
         
         hourly_stats['conversion_rate'] = (hourly_stats['conversion_flag'] / hourly_stats['user_id'] * 100).round(2)
         hourly_stats['connectivity_rate'] = (hourly_stats['current_status'] / hourly_stats['user_id'] * 100).round(2)
         
         return hourly_stats
     
+    def analyze_class_performance(self):
+        if not self.loaded:
+            return None
+            
+        class_stats = self.backend.aggregate(
+            ['target_class'], ['consultations', 'conversions', 'completed']
+        ).rename(columns={'consultations': 'user_id', 'conversions': 'conversion_flag', 'completed': 'current_status'})
+        
+        class_stats['conversion_rate'] = (class_stats['conversion_flag'] / class_stats['user_id'] * 100).round(2)
+        class_stats['connectivity_rate'] = (class_stats['current_status'] / class_stats['user_id'] * 100).round(2)
+        
+        return class_stats
+    
+    def analyze_funnel_performance(self):
+        if not self.loaded:
+            return None
+            
+        funnel_performance = self.backend.aggregate(
+            ['funnel'], ['consultations', 'conversions']
+        ).rename(columns={'consultations': 'user_id', 'conversions': 'conversion_flag'})
+        funnel_performance['conversion_rate'] = (funnel_performance['conversion_flag'] / funnel_performance['user_id'] * 100).round(2)
+        
+        return funnel_performance
+    
+    def analyze_distribution(self, column):
+        if not self.loaded:
+            return None
+            
+        return self.backend.aggregate([column], ['consultations']).rename(columns={'consultations': 'user_id'})
+    
+    def analyze_user_journeys(self):
+        if not self.loaded:
+            return None
+            
+        if self.journeys is None:
+            self.journeys = self.backend.user_journeys()
+        
+        return {
+            'summary': journey_summary(self.journeys),
+            'first_touch': journey_attribution(self.journeys, 'first'),
+            'last_touch': journey_attribution(self.journeys, 'last')
+        }
+    
     def get_key_insights(self):
-        if self.df is None:
+        if not self.loaded:
             return None
             
         insights = {}
         
-        insights['total_consultations'] = len(self.df)
-        insights['total_conversions'] = self.df['conversion_flag'].sum()
+        insights['total_consultations'] = self.backend.row_count()
+        insights['total_conversions'] = self.backend.totals(['conversions'])['conversions']
         insights['overall_conversion_rate'] = (insights['total_conversions'] / insights['total_consultations'] * 100)
-        insights['active_coaches'] = self.df['expert_id'].nunique()
+        insights['active_coaches'] = self.backend.distinct_count('expert_id')
+        
+        journeys = self.analyze_user_journeys()
+        user_summary = journeys['summary']
+        insights['total_users'] = user_summary['total_users']
+        insights['converted_users'] = user_summary['converted_users']
+        insights['user_conversion_rate'] = user_summary['user_conversion_rate']
+        insights['avg_consultations_to_conversion'] = user_summary['avg_consultations_to_conversion']
+        
+        for touch in ['first_touch', 'last_touch']:
+            attribution = journeys[touch]
+            if len(attribution) > 0:
+                best = attribution.loc[attribution['user_conversion_rate'].idxmax()]
+                insights[f'best_{touch}_segment'] = f"{best['funnel']} - {best['lead_type']}"
+                insights[f'best_{touch}_rate'] = best['user_conversion_rate']
         
         conv_3d = self.calculate_conversion_rates(3)
         conv_7d = self.calculate_conversion_rates(7)
@@ -100,11 +173,7 @@ class iScaleDataAnalyzer:
             insights['best_7d_segment'] = f"{best_7d['funnel']} - {best_7d['lead_type']}"
             insights['best_7d_rate'] = best_7d['conversion_rate_7d']
         
-        funnel_performance = self.df.groupby('funnel').agg({
-            'user_id': 'count',
-            'conversion_flag': 'sum'
-        }).reset_index()
-        funnel_performance['conversion_rate'] = (funnel_performance['conversion_flag'] / funnel_performance['user_id'] * 100).round(2)
+        funnel_performance = self.analyze_funnel_performance()
         
         if len(funnel_performance) > 0:
             best_funnel = funnel_performance.loc[funnel_performance['conversion_rate'].idxmax()]
@@ -139,7 +208,11 @@ class iScaleDataAnalyzer:
                 'total_consultations': insights['total_consultations'],
                 'total_conversions': insights['total_conversions'],
                 'overall_conversion_rate': round(insights['overall_conversion_rate'], 2),
-                'active_coaches': insights['active_coaches']
+                'active_coaches': insights['active_coaches'],
+                'total_users': insights['total_users'],
+                'converted_users': insights['converted_users'],
+                'user_conversion_rate': round(insights['user_conversion_rate'], 2),
+                'avg_consultations_to_conversion': round(insights['avg_consultations_to_conversion'], 2)
             },
             'key_findings': {
                 'best_funnel': insights.get('best_funnel', 'N/A'),
@@ -153,7 +226,11 @@ class iScaleDataAnalyzer:
                 'best_3d_segment': insights.get('best_3d_segment', 'N/A'),
                 'best_3d_rate': insights.get('best_3d_rate', 0),
                 'best_7d_segment': insights.get('best_7d_segment', 'N/A'), 
-                'best_7d_rate': insights.get('best_7d_rate', 0)
+                'best_7d_rate': insights.get('best_7d_rate', 0),
+                'best_first_touch_segment': insights.get('best_first_touch_segment', 'N/A'),
+                'best_first_touch_rate': insights.get('best_first_touch_rate', 0),
+                'best_last_touch_segment': insights.get('best_last_touch_segment', 'N/A'),
+                'best_last_touch_rate': insights.get('best_last_touch_rate', 0)
             }
         }
         
@@ -180,7 +257,11 @@ class iScaleDataAnalyzer:
             
             with open(output_file, 'w') as f:
                 json.dump(summary_converted, f, indent=2)
+            quality_file = os.path.splitext(output_file)[0] + '_quality.json'
+            with open(quality_file, 'w') as f:
+                json.dump(self.get_data_quality(), f, indent=2)
             print(f"✅ Analysis results exported to: {output_file}")
+            print(f"✅ Data quality report exported to: {quality_file}")
             return True
         except Exception as e:
             print(f"❌ Error exporting results: {str(e)}")
@@ -224,14 +305,15 @@ class iScaleDataAnalyzer:
         print(f"💰 Total Conversions: {insights['total_conversions']:,}")
         print(f"📈 Overall Conversion Rate: {insights['overall_conversion_rate']:.1f}%")
         print(f"👥 Active Coaches: {insights['active_coaches']:,}")
+        print(f"🧑 Unique Users: {insights['total_users']:,} ({insights['user_conversion_rate']:.1f}% converted)")
+        print(f"🔁 Consultations per Conversion: {insights['avg_consultations_to_conversion']:.2f}")
         
-        current_rate = insights['overall_conversion_rate']
-        potential_rate = current_rate * 1.2  # 20% improvement estimate
-        additional_conversions = insights['total_consultations'] * (potential_rate - current_rate) / 100
+        summary, uplift = SlotPolicySimulator.from_analyzer(self, seed=42).compare_peak_share(0.7)
+        current, proposed = summary.iloc[0], summary.iloc[1]
         
-        print(f"🚀 Potential 20% Improvement: {potential_rate:.1f}% conversion rate")
-        print(f"💡 Additional Monthly Conversions: ~{int(additional_conversions):,}")
-        print(f"📈 RECOMMENDATION: Implement optimal timing + funnel focus for 15-20% growth")
+        print(f"🚀 Simulated 70% Peak-Hour Schedule: {proposed['conversion_rate_mean']:.1f}% conversion rate (now {current['conversion_rate_mean']:.1f}%)")
+        print(f"💡 Additional Conversions: ~{int(uplift['uplift_mean']):,} (90% range {int(uplift['uplift_p5']):,} to {int(uplift['uplift_p95']):,})")
+        print(f"📈 RECOMMENDATION: Implement optimal timing + funnel focus ({uplift['probability_better']:.0%} chance of improvement)")
         
         print("\n" + "="*80)
         print("🎉 Analysis Complete - Ready for Streamlit Dashboard Integration")
@@ -241,7 +323,7 @@ class iScaleDataAnalyzer:
 def main():
     CSV_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'iScale_MaskedData.csv')
     
-    analyzer = iScaleDataAnalyzer(CSV_FILE_PATH)
+    analyzer = iScaleDataAnalyzer(CSV_FILE_PATH, backend=os.environ.get('ISCALE_BACKEND', 'pandas'))
     
     if not analyzer.load_and_process_data():
         return
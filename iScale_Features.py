@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+DATETIME_COLUMNS = ['handled_time', 'slot_start_time', 'payment_time']
+MEDICAL_FLAG_MAP = {True: 'Medical', False: 'NonMedical', 'Yes': 'Medical', 'No': 'NonMedical'}
+# Columns whose values are mapped to labels; anything else is reported as unknown.
+KNOWN_VALUES = {'medicalconditionflag': list(MEDICAL_FLAG_MAP)}
+# Rows sharing these values are the same consultation booked twice.
+CONSULTATION_KEY = ['user_id', 'slot_start_time', 'expert_id']
+
+# name -> (required columns, builder). Builders only run the first time a
+# column is requested, so unused features cost nothing at load time.
+DERIVED_FEATURES = {}
+
+
+def derived_feature(name, *requires):
+    def register(builder):
+        DERIVED_FEATURES[name] = (requires, builder)
+        return builder
+    return register
+
+
+def ensure_features(df, names):
+    """Materialize the requested derived columns on ``df`` in place."""
+    for name in names:
+        if name in df.columns:
+            continue
+        if name not in DERIVED_FEATURES:
+            raise KeyError(f"Unknown column or derived feature: {name}")
+        requires, builder = DERIVED_FEATURES[name]
+        ensure_features(df, requires)
+        df[name] = builder(df)
+    return df
+
+
+def _hour(ts):
+    return ts.dt.hour.astype('Int8')
+
+
+def _day_number(ts):
+    return ((ts - pd.Timestamp(0)) // pd.Timedelta(days=1)).astype('Int32')
+
+
+def encode_lead_type(region, medical_flag):
+    region_codes, regions = pd.factorize(region)
+    flag_codes, raw_flags = pd.factorize(medical_flag)
+    mapped_codes, flags = pd.factorize(pd.Series(raw_flags).map(MEDICAL_FLAG_MAP))
+    flag_codes = np.append(mapped_codes, -1)[flag_codes]
+
+    codes = np.where((region_codes >= 0) & (flag_codes >= 0), region_codes * len(flags) + flag_codes, -1)
+    labels = [f"{r}_{f}" for r in regions for f in flags]
+    lead_type = pd.Categorical.from_codes(codes, categories=labels).remove_unused_categories()
+    return lead_type.reorder_categories(sorted(lead_type.categories))
+
+
+@derived_feature('conversion_flag', 'payment_time')
+def _conversion_flag(df):
+    return df['payment_time'].notna().astype('int8')
+
+
+@derived_feature('connectivity_flag', 'booked_flag')
+def _connectivity_flag(df):
+    return (df['booked_flag'] == 'Booked').astype('int8')
+
+
+@derived_feature('completed_flag', 'current_status')
+def _completed_flag(df):
+    return (df['current_status'] == 'Done').astype('int8')
+
+
+@derived_feature('handled_hour', 'handled_time')
+def _handled_hour(df):
+    return _hour(df['handled_time'])
+
+
+@derived_feature('slot_hour', 'slot_start_time')
+def _slot_hour(df):
+    return _hour(df['slot_start_time'])
+
+
+@derived_feature('slot_month', 'slot_start_time')
+def _slot_month(df):
+    # Format each distinct month once rather than every row
+    months = df['slot_start_time'].to_numpy(dtype='datetime64[ns]').astype('datetime64[M]')
+    codes, uniques = pd.factorize(months, sort=True)
+    labels = pd.DatetimeIndex(uniques).strftime('%Y-%m')
+    return pd.Series(pd.Categorical.from_codes(codes, labels), index=df.index)
+
+
+@derived_feature('handled_date', 'handled_time')
+def _handled_date(df):
+    return _day_number(df['handled_time'])
+
+
+@derived_feature('payment_date', 'payment_time')
+def _payment_date(df):
+    return _day_number(df['payment_time'])
+
+
+@derived_feature('conversion_days', 'payment_time', 'slot_start_time')
+def _conversion_days(df):
+    return (df['payment_time'] - df['slot_start_time']).dt.days.astype('Int32')
+
+
+@derived_feature('lead_type', 'India vs NRI', 'medicalconditionflag')
+def _lead_type(df):
+    return encode_lead_type(df['India vs NRI'], df['medicalconditionflag'])
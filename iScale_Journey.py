@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+JOURNEY_COLUMNS = ['user_id', 'slot_start_time', 'payment_time', 'funnel', 'lead_type']
+JOURNEY_OUTPUT_COLUMNS = ['user_id', 'consultations', 'converted', 'consultations_to_conversion',
+                          'first_funnel', 'first_lead_type', 'last_funnel', 'last_lead_type']
+_NAT_LAST = np.iinfo(np.int64).max
+
+
+def _as_int64(ts):
+    values = ts.to_numpy(dtype='datetime64[ns]').view('int64').copy()
+    values[pd.isna(ts).to_numpy()] = _NAT_LAST
+    return values
+
+
+def build_user_journeys(df):
+    """Collapse consultation rows into one row per user.
+
+    Rows are ordered once by (user_id, slot_start_time); every per-user
+    quantity is then taken from run boundaries with reduceat, so the cost
+    is a single sort plus linear passes regardless of how many users.
+    """
+    user_codes, users = pd.factorize(df['user_id'])
+    slot = _as_int64(df['slot_start_time'])
+    payment = _as_int64(df['payment_time'])
+    valid = np.flatnonzero(user_codes >= 0)
+    order = valid[np.lexsort((slot[valid], user_codes[valid]))]
+    if len(order) == 0:
+        return pd.DataFrame(columns=JOURNEY_OUTPUT_COLUMNS)
+
+    sorted_users = user_codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_users[1:] != sorted_users[:-1]])
+    consultations = np.diff(np.r_[starts, len(order)])
+
+    sorted_slot = slot[order]
+    first_payment = np.minimum.reduceat(payment[order], starts)
+    converted = first_payment != _NAT_LAST
+
+    before_payment = sorted_slot <= np.repeat(first_payment, consultations)
+    to_conversion = np.maximum(np.add.reduceat(before_payment.astype(np.int64), starts), 1)
+    last_offset = np.where(converted, to_conversion, consultations) - 1
+
+    first_rows = order[starts]
+    last_rows = order[starts + last_offset]
+    return pd.DataFrame({
+        'user_id': users[sorted_users[starts]],
+        'consultations': consultations,
+        'converted': converted.astype('int8'),
+        'consultations_to_conversion': np.where(converted, to_conversion, 0),
+        'first_funnel': df['funnel'].array[first_rows],
+        'first_lead_type': df['lead_type'].array[first_rows],
+        'last_funnel': df['funnel'].array[last_rows],
+        'last_lead_type': df['lead_type'].array[last_rows],
+    })
+
+
+def journey_attribution(journeys, touch='first'):
+    """User-level conversion by the funnel/lead_type of the first or last touch."""
+    keys = {f'{touch}_funnel': 'funnel', f'{touch}_lead_type': 'lead_type'}
+    stats = journeys.groupby(list(keys), observed=True).agg(
+        users=('user_id', 'count'),
+        converted_users=('converted', 'sum'),
+        consultations=('consultations', 'sum'),
+    ).reset_index().rename(columns=keys)
+    stats['user_conversion_rate'] = (stats['converted_users'] / stats['users'] * 100).round(2)
+    stats['consultations_per_user'] = (stats['consultations'] / stats['users']).round(2)
+    return stats
+
+
+def journey_summary(journeys):
+    converters = journeys[journeys['converted'] == 1]
+    total_users = len(journeys)
+    converted_users = len(converters)
+    return {
+        'total_users': total_users,
+        'converted_users': converted_users,
+        'user_conversion_rate': (converted_users / total_users * 100) if total_users else 0.0,
+        'avg_consultations_per_user': journeys['consultations'].mean() if total_users else 0.0,
+        'avg_consultations_to_conversion': converters['consultations_to_conversion'].mean() if converted_users else 0.0,
+        'consultations_to_conversion': converters['consultations_to_conversion'].value_counts().sort_index().to_dict()
+    }
@@ -0,0 +1,587 @@
+import argparse
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from iScale_Backend import _compare, parity_analyses, quality_report
+from iScale_Features import CONSULTATION_KEY, DATETIME_COLUMNS, KNOWN_VALUES, MEDICAL_FLAG_MAP
+from iScale_Journey import JOURNEY_OUTPUT_COLUMNS
+from iScale_Parallel import CUBE_KEYS, CUBE_MEASURES, CubeBackend, categorize_keys
+
+# One JSON object per line with an "event" field:
+#   consultation  a booked consultation: the snapshot's columns
+#   connection    booked_flag / current_status / handled_time of a consultation
+#   payment       payment_time of a consultation
+# Connection and payment events name their consultation by consultation_id
+# when the feed assigns one. Without it they fall back to CONSULTATION_KEY and
+# update the latest consultation booked under that key, so a key booked
+# twice never has one update applied to both rows.
+EVENT_TYPES = ('consultation', 'connection', 'payment')
+UPDATE_FIELDS = {
+    'connection': ('booked_flag', 'current_status', 'handled_time'),
+    'payment': ('payment_time',),
+}
+TRACKED_FIELDS = UPDATE_FIELDS['connection'] + UPDATE_FIELDS['payment']
+EVENT_ID = 'consultation_id'
+# Event fields that are not consultation columns
+EVENT_METADATA = ('event', EVENT_ID)
+_ROWS, _CONSULTATIONS, _CONVERSIONS, _CONNECTED, _COMPLETED = range(len(CUBE_MEASURES))
+
+
+def _missing(value):
+    return value is None or value == '' or (isinstance(value, float) and value != value)
+
+
+def _scalar(value):
+    return None if _missing(value) else (value.item() if hasattr(value, 'item') else value)
+
+
+def _timestamp(value):
+    """(datetime or None, coerced) with the batch loader's coercion of unparseable values."""
+    if _missing(value):
+        return None, False
+    if isinstance(value, datetime):
+        return value, False
+    try:
+        return datetime.fromisoformat(str(value)), False
+    except ValueError:
+        return None, True
+
+
+def _lead_type(region, medical_flag):
+    flag = MEDICAL_FLAG_MAP.get(medical_flag) if not _missing(medical_flag) else None
+    return f"{region}_{flag}" if flag is not None and not _missing(region) else None
+
+
+class _Consultation:
+    __slots__ = ('user', 'seq', 'slot', 'cell', 'funnel', 'lead_type', 'payment', 'lag', 'connected', 'completed',
+                 'states')
+
+    def order(self):
+        # Journeys order a user's consultations by slot, unparsed slots last, then arrival
+        return (self.slot is None, self.slot or datetime.min, self.seq)
+
+
+class _Journey:
+    """One user's journey, kept current as consultations and payments arrive."""
+    __slots__ = ('consultations', 'records', 'first', 'last', 'first_payment', 'before_payment', 'last_before_payment')
+
+    def __init__(self):
+        self.consultations = 0
+        self.records = []
+        self.first = self.last = self.first_payment = self.last_before_payment = None
+        self.before_payment = 0
+
+    def add(self, record):
+        self.consultations += 1
+        self.records.append(record)
+        if self.first is None or record.order() < self.first.order():
+            self.first = record
+        if self.last is None or record.order() > self.last.order():
+            self.last = record
+        if self.first_payment is not None and record.slot is not None and record.slot <= self.first_payment:
+            self.before_payment += 1
+            if self.last_before_payment is None or record.order() > self.last_before_payment.order():
+                self.last_before_payment = record
+
+    def paid(self, old, new):
+        """Re-derive the conversion point after one consultation's payment changed from ``old`` to ``new``."""
+        first_payment = self.first_payment
+        if new is not None and (first_payment is None or new < first_payment):
+            first_payment = new
+        elif old is not None and old == first_payment and (new is None or new > old):
+            first_payment = min((r.payment for r in self.records if r.payment is not None), default=None)
+        if first_payment == self.first_payment:
+            return
+        # Only an earlier (or withdrawn) first payment rescans this user's consultations
+        self.first_payment = first_payment
+        before = [r for r in self.records if first_payment is not None and r.slot is not None and r.slot <= first_payment]
+        self.before_payment = len(before)
+        self.last_before_payment = max(before, key=_Consultation.order, default=None)
+
+    def row(self, user_id):
+        converted = self.first_payment is not None
+        if converted:
+            last = self.last_before_payment if self.before_payment else self.first
+        else:
+            last = self.last
+        return (user_id, self.consultations, int(converted), max(self.before_payment, 1) if converted else 0,
+                self.first.funnel, self.first.lead_type, last.funnel, last.lead_type)
+
+
+class LiveBackend:
+    """Metrics kept current from a stream of booking events.
+
+    Each event updates the counters of one cube cell (the same cells the
+    parallel backend merges), one payment-lag bucket, one user's journey
+    and the quality counters, so applying it is constant work; the one
+    exception is a payment that moves a user's first payment earlier,
+    which rescans that user's consultations. Consultations are found by
+    consultation_id (or CONSULTATION_KEY) in a dict. Queries run on a
+    snapshot of one consistent state, reused until the next event.
+    """
+    name = 'live'
+    df = None
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self.source = None
+        self.offset = 0
+        self.server = None
+        self.loaded = False
+        self._reset()
+
+    def _reset(self):
+        with self._lock:
+            self.events = 0
+            self.rejected = 0
+            self.cells = {}
+            self.lags = {}
+            self.by_key = {}
+            self.by_id = {}
+            self.pending = {}
+            self.journeys = {}
+            # Each user's journey row as of the last snapshot, and who changed since
+            self.journey_rows = {}
+            self.changed_users = set()
+            self.rows = 0
+            self.nulls = {}
+            self.coerced = {col: 0 for col in DATETIME_COLUMNS}
+            self.unknown = {col: {} for col in KNOWN_VALUES}
+            self.negative_lags = 0
+            self.duplicates = 0
+            self._snapshot = None
+
+    # Event handling
+
+    def apply(self, event):
+        """Apply one event (a dict); returns False if it is not a recognised event."""
+        kind = event.get('event')
+        if kind not in EVENT_TYPES:
+            self.rejected += 1
+            return False
+        with self._lock:
+            if kind == 'consultation':
+                self._add(event)
+            else:
+                target = self._target(event)
+                updates = {field: event[field] for field in UPDATE_FIELDS[kind] if field in event}
+                record = self.by_id.get(target[1]) if target[0] == 'id' else (self.by_key.get(target[1]) or [None])[-1]
+                if record is None:
+                    # Arrived before its consultation; applied when that shows up
+                    self.pending.setdefault(target, []).append(updates)
+                else:
+                    self._update(record, updates)
+            self.events += 1
+            self.loaded = True
+            self._snapshot = None
+        return True
+
+    def apply_line(self, line):
+        try:
+            event = json.loads(line)
+        except ValueError:
+            self.rejected += 1
+            return False
+        return self.apply(event) if isinstance(event, dict) else False
+
+    def _key(self, event):
+        return tuple(_timestamp(event.get(col))[0] if col in DATETIME_COLUMNS else _scalar(event.get(col))
+                     for col in CONSULTATION_KEY)
+
+    def _target(self, event):
+        ident = _scalar(event.get(EVENT_ID))
+        return ('id', ident) if ident is not None else ('key', self._key(event))
+
+    def _note_columns(self, event):
+        for col in event:
+            if col not in EVENT_METADATA and col not in self.nulls:
+                # A column first seen now was missing from every earlier row
+                self.nulls[col] = self.rows
+
+    def _add(self, event):
+        self._note_columns(event)
+        for col in TRACKED_FIELDS + ('slot_start_time',):
+            self.nulls.setdefault(col, self.rows)
+        record = _Consultation()
+        record.seq = self.rows
+        record.user = _scalar(event.get('user_id'))
+        record.slot, coerced = _timestamp(event.get('slot_start_time'))
+        record.funnel = _scalar(event.get('funnel'))
+        record.lead_type = _lead_type(event.get('India vs NRI'), event.get('medicalconditionflag'))
+        record.cell = (record.funnel, record.lead_type, _scalar(event.get('target_class')), _scalar(event.get('expert_id')),
+                       record.slot.hour if record.slot is not None else None,
+                       record.slot.strftime('%Y-%m') if record.slot is not None else None)
+        record.payment = record.lag = None
+        record.connected = record.completed = 0
+        record.states = {col: 'null' for col in TRACKED_FIELDS}
+
+        self.rows += 1
+        for col in self.nulls:
+            # Tracked fields start out null and are counted again as they are set
+            if col in TRACKED_FIELDS or (col != 'slot_start_time' and _missing(event.get(col))):
+                self.nulls[col] += 1
+        if record.slot is None:
+            self.nulls['slot_start_time'] += 1
+            self.coerced['slot_start_time'] += coerced
+        for col in KNOWN_VALUES:
+            value = event.get(col)
+            if not _missing(value) and value not in KNOWN_VALUES[col]:
+                self.unknown[col][str(value)] = self.unknown[col].get(str(value), 0) + 1
+
+        counts = self.cells.setdefault(record.cell, [0] * len(CUBE_MEASURES))
+        counts[_ROWS] += 1
+        counts[_CONSULTATIONS] += record.user is not None
+
+        key = (record.user, record.slot, record.cell[3])
+        records = self.by_key.setdefault(key, [])
+        self.duplicates += bool(records)
+        records.append(record)
+        target = self._target(event)
+        if target[0] == 'id':
+            self.by_id[target[1]] = record
+        if record.user is not None:
+            journey = self.journeys.get(record.user)
+            if journey is None:
+                journey = self.journeys[record.user] = _Journey()
+            journey.add(record)
+            self.changed_users.add(record.user)
+
+        self._update(record, {col: event[col] for col in TRACKED_FIELDS if col in event})
+        for updates in self.pending.pop(target, []) + self.pending.pop(('key', key), []):
+            self._update(record, updates)
+
+    def _update(self, record, updates):
+        counts = self.cells[record.cell]
+        for col, value in updates.items():
+            if col in DATETIME_COLUMNS:
+                parsed, coerced = _timestamp(value)
+                state = 'coerced' if coerced else ('null' if parsed is None else 'ok')
+            else:
+                parsed = _scalar(value)
+                state = 'null' if parsed is None else 'ok'
+            old_state = record.states[col]
+            self.nulls[col] += (state != 'ok') - (old_state != 'ok')
+            if col in self.coerced:
+                self.coerced[col] += (state == 'coerced') - (old_state == 'coerced')
+            record.states[col] = state
+
+            if col == 'booked_flag':
+                connected = int(parsed == 'Booked')
+                counts[_CONNECTED] += connected - record.connected
+                record.connected = connected
+            elif col == 'current_status':
+                completed = int(parsed == 'Done')
+                counts[_COMPLETED] += completed - record.completed
+                record.completed = completed
+            elif col == 'payment_time':
+                self._pay(record, counts, parsed)
+
+    def _pay(self, record, counts, payment):
+        old = record.payment
+        counts[_CONVERSIONS] += (payment is not None) - (old is not None)
+        if record.lag is not None:
+            self._count_lag(record, -1)
+        record.payment = payment
+        record.lag = (payment - record.slot).days if payment is not None and record.slot is not None else None
+        if record.lag is not None:
+            self._count_lag(record, 1)
+        if record.user is not None and old != payment:
+            self.journeys[record.user].paid(old, payment)
+            self.changed_users.add(record.user)
+
+    def _count_lag(self, record, step):
+        bucket = (record.cell, record.lag)
+        self.lags[bucket] = self.lags.get(bucket, 0) + step
+        if record.payment < record.slot:
+            self.negative_lags += step
+
+    # Sources
+
+    def load(self, source):
+        """Replay an event log from the start; ``poll``/``follow`` then pick up appended events."""
+        self._reset()
+        self.source = source
+        self.offset = 0
+        self.loaded = True
+        self.poll()
+
+    def poll(self):
+        """Apply complete lines appended to the log since the last call; returns how many were read."""
+        if self.source is None:
+            return 0
+        size = os.path.getsize(self.source)
+        if size < self.offset:
+            # The log was truncated or replaced: start over
+            self._reset()
+            self.offset = 0
+        with open(self.source, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        complete = data.rfind(b'\n') + 1
+        lines = data[:complete].splitlines()
+        for line in lines:
+            if line.strip():
+                self.apply_line(line)
+        self.offset += complete
+        return len(lines)
+
+    def follow(self, interval=1.0):
+        """Tail the log in a background thread."""
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.poll()
+                except OSError:
+                    pass
+        thread = threading.Thread(target=run, name='iscale-live-follow', daemon=True)
+        thread.start()
+        return thread
+
+    def serve(self, host='127.0.0.1', port=0):
+        """Accept newline-delimited events over TCP in a background thread; returns the bound (host, port)."""
+        backend = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if line.strip():
+                        backend.apply_line(line)
+
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.loaded = True
+        threading.Thread(target=self.server.serve_forever, name='iscale-live-serve', daemon=True).start()
+        return self.server.server_address
+
+    def stop(self):
+        self._stop.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    # Queries
+
+    def snapshot(self):
+        """Point-in-time CubeBackend over the current state.
+
+        Only the per-cell counters and the journey rows of users who changed
+        since the last snapshot are copied under the lock; the frames are
+        built outside it so ingestion isn't stalled by a refresh. The result
+        is cached only if no event arrived meanwhile.
+        """
+        with self._lock:
+            if self._snapshot is not None:
+                return self._snapshot
+            events = self.events
+            cells = [cell + tuple(counts) for cell, counts in self.cells.items()]
+            lag_rows = [cell + (lag, rows) for (cell, lag), rows in self.lags.items() if rows]
+            for user in self.changed_users:
+                self.journey_rows[user] = self.journeys[user].row(user)
+            self.changed_users.clear()
+            journey_rows = list(self.journey_rows.values())
+            quality = quality_report(self.rows, self.nulls, self.coerced,
+                                     {col: dict(sorted(counts.items(), key=lambda item: -item[1]))
+                                      for col, counts in self.unknown.items()},
+                                     self.negative_lags, self.duplicates)
+        cube = pd.DataFrame.from_records(cells, columns=CUBE_KEYS + CUBE_MEASURES)
+        lags = pd.DataFrame.from_records(lag_rows, columns=CUBE_KEYS + ['conversion_days', 'rows'])
+        journeys = pd.DataFrame.from_records(journey_rows, columns=JOURNEY_OUTPUT_COLUMNS)
+        for frame in (cube, lags):
+            frame['slot_hour'] = frame['slot_hour'].astype('Int8')
+        lags['conversion_days'] = lags['conversion_days'].astype('Int32')
+        dtypes = categorize_keys(cube, lags)
+        for col in ('first_lead_type', 'last_lead_type'):
+            journeys[col] = journeys[col].astype(dtypes['lead_type'])
+        journeys['converted'] = journeys['converted'].astype('int8')
+        snapshot = CubeBackend(cube, lags, journeys['user_id'].to_numpy(), journeys, quality)
+        snapshot.name = self.name
+        with self._lock:
+            if self.events == events and self._snapshot is None:
+                self._snapshot = snapshot
+            return snapshot
+
+    def stats(self):
+        with self._lock:
+            return {'events': self.events, 'rejected': self.rejected, 'consultations': self.rows,
+                    'users': len(self.journeys), 'pending': sum(map(len, self.pending.values()))}
+
+    @property
+    def quality(self):
+        return self.snapshot().quality
+
+    def row_count(self):
+        return self.snapshot().row_count()
+
+    def distinct_count(self, column):
+        return self.snapshot().distinct_count(column)
+
+    def totals(self, measures, within_days=None):
+        return self.snapshot().totals(measures, within_days)
+
+    def aggregate(self, keys, measures, within_days=None):
+        return self.snapshot().aggregate(keys, measures, within_days)
+
+    def user_journeys(self):
+        return self.snapshot().user_journeys()
+
+    def require(self, *features):
+        return self.snapshot().require(*features)
+
+    def columns(self, names):
+        return self.snapshot().columns(names)
+
+    def subset(self, filters):
+        return self.snapshot().subset(filters)
+
+    def memory_bytes(self):
+        return self.snapshot().memory_bytes()
+
+
+def snapshot_events(df):
+    """Events that rebuild a snapshot read with ``pd.read_csv``: every consultation, then its updates.
+
+    Connection and payment updates follow in the order they happened, as
+    the booking system would emit them. Each row's position is its
+    consultation_id, so rows that share a CONSULTATION_KEY keep their own
+    updates.
+    """
+    rows = df.astype(object).where(df.notna(), None).to_dict('records')
+    tracked = set(TRACKED_FIELDS)
+    updates = []
+    for position, row in enumerate(rows):
+        key = {EVENT_ID: position, **{col: row.get(col) for col in CONSULTATION_KEY}}
+        yield {'event': 'consultation', **{col: value for col, value in row.items() if col not in tracked},
+               EVENT_ID: position}
+        connection = {col: row[col] for col in UPDATE_FIELDS['connection'] if row.get(col) is not None}
+        if connection:
+            updates.append((str(connection.get('handled_time') or ''), {'event': 'connection', **key, **connection}))
+        if row.get('payment_time') is not None:
+            updates.append((str(row['payment_time']), {'event': 'payment', **key, 'payment_time': row['payment_time']}))
+    updates.sort(key=lambda update: update[0])
+    for _, event in updates:
+        yield event
+
+
+def replay(snapshot_path, log_path, delay=0.0):
+    """Append a snapshot's events to ``log_path``, optionally ``delay`` seconds apart."""
+    count = 0
+    with open(log_path, 'a') as log:
+        for event in snapshot_events(pd.read_csv(snapshot_path, low_memory=False)):
+            log.write(json.dumps(event, default=str) + '\n')
+            count += 1
+            if delay:
+                log.flush()
+                time.sleep(delay)
+    print(f"✅ Wrote {count:,} events to {log_path}")
+
+
+def with_duplicate_keys(df, n=3):
+    """``df`` plus ``n`` rows that rebook paid consultations under the same CONSULTATION_KEY, unpaid.
+
+    A payment routed by key alone would land on both bookings and show up
+    as extra conversions.
+    """
+    paid = df[df['payment_time'].notna() & df['user_id'].notna() & df['slot_start_time'].notna()]
+    rebooked = paid.head(n).copy()
+    rebooked[list(TRACKED_FIELDS)] = None
+    return pd.concat([df, rebooked], ignore_index=True)
+
+
+def verify_frame(df, label='live'):
+    """Replay ``df`` (as read by ``pd.read_csv``) as events and compare with the batch pandas backend."""
+    from iScale_Backend import PandasBackend
+    from iScale_DA import iScaleDataAnalyzer
+
+    backend = PandasBackend()
+    backend.prepare(df.copy())
+    batch = iScaleDataAnalyzer(None, backend=backend)
+    live = LiveBackend()
+    start = time.perf_counter()
+    for event in snapshot_events(df):
+        live.apply(json.loads(json.dumps(event, default=str)))
+    elapsed = time.perf_counter() - start
+    print(f"⏱️ {label}: applied {live.events:,} events in {elapsed:.2f}s "
+          f"({elapsed / max(live.events, 1) * 1e6:.1f} µs/event)")
+
+    streamed = iScaleDataAnalyzer(None, backend=live)
+    mismatches = []
+    for name, (method, args) in parity_analyses(iScaleDataAnalyzer).items():
+        _compare(getattr(batch, method)(*args), getattr(streamed, method)(*args), name, mismatches)
+    if mismatches:
+        print(f"❌ {label}: {len(mismatches)} mismatches")
+        for mismatch in mismatches:
+            print(f"   {mismatch}")
+    else:
+        print(f"✅ {label}: matches the batch analysis")
+    return not mismatches
+
+
+def verify(snapshot_path):
+    """Replay a snapshot as events, as is and with duplicate consultation keys, against the batch analysis."""
+    df = pd.read_csv(snapshot_path)
+    ok = verify_frame(df)
+    return verify_frame(with_duplicate_keys(df), 'live with duplicate keys') and ok
+
+
+def watch(live, interval):
+    from iScale_DA import iScaleDataAnalyzer
+
+    while True:
+        time.sleep(interval)
+        snapshot = live.snapshot()
+        if snapshot.row_count() == 0:
+            continue
+        insights = iScaleDataAnalyzer(live.source, backend=snapshot).get_key_insights()
+        print(f"{datetime.now():%H:%M:%S} {insights['total_consultations']:,} consultations, "
+              f"{insights['overall_conversion_rate']:.1f}% conversion, best hour {insights.get('best_conversion_hour')}, "
+              f"best funnel {insights.get('best_funnel')} ({live.stats()['events']:,} events)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Live consultation metrics from booking events.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    command = commands.add_parser('watch', help="tail an event log and print KPIs")
+    command.add_argument('log')
+    command.add_argument('--interval', type=float, default=5.0)
+    command = commands.add_parser('serve', help="accept events over TCP and print KPIs")
+    command.add_argument('--host', default='127.0.0.1')
+    command.add_argument('--port', type=int, default=9555)
+    command.add_argument('--interval', type=float, default=5.0)
+    command = commands.add_parser('replay', help="write a snapshot's events to a log")
+    command.add_argument('snapshot')
+    command.add_argument('log')
+    command.add_argument('--delay', type=float, default=0.0, help="seconds between events")
+    command = commands.add_parser('verify', help="check live metrics against the batch analysis")
+    command.add_argument('snapshot')
+    args = parser.parse_args(argv)
+
+    if args.command == 'replay':
+        replay(args.snapshot, args.log, args.delay)
+        return True
+    if args.command == 'verify':
+        return verify(args.snapshot)
+
+    live = LiveBackend()
+    if args.command == 'watch':
+        live.load(args.log)
+        live.follow()
+    else:
+        host, port = live.serve(args.host, args.port)
+        print(f"✅ Listening for events on {host}:{port}")
+    try:
+        watch(live, args.interval)
+    except KeyboardInterrupt:
+        live.stop()
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,231 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from iScale_Simulator import HOURS, SEGMENT_KEYS, estimate_prior_strength
+
+
+class CoachLeadMatcher:
+    """Assigns a day's leads to coach classes to maximize expected conversions.
+
+    Historical conversion rates are scored for every (lead segment, coach
+    class, slot hour) cell, shrunk towards the segment's hourly rate so thin
+    cells don't dominate. Unless given, the prior strength is estimated
+    from how much classes actually differ beyond binomial noise (empirical
+    Bayes); when they don't, every class scores the same and matching
+    promises nothing. Leads with the same segment and hour are
+    interchangeable, so each hour is solved as one small transportation
+    problem (min-cost flow) over aggregated counts instead of per lead.
+    """
+
+    def __init__(self, stats, prior_strength=None):
+        segments = stats[SEGMENT_KEYS].astype(str).drop_duplicates().reset_index(drop=True)
+        self.segments = pd.MultiIndex.from_frame(segments)
+        self.classes = pd.Index(sorted(stats['target_class'].unique()))
+
+        s = self.segments.get_indexer(pd.MultiIndex.from_frame(stats[SEGMENT_KEYS].astype(str)))
+        k = self.classes.get_indexer(stats['target_class'])
+        h = stats['slot_hour'].to_numpy(dtype=np.int64)
+        shape = (len(self.segments) + 1, len(self.classes), HOURS)
+
+        consultations = np.zeros(shape)
+        conversions = np.zeros(shape)
+        np.add.at(consultations, (s, k, h), stats['consultations'].to_numpy())
+        np.add.at(conversions, (s, k, h), stats['conversions'].to_numpy())
+        if prior_strength is None:
+            prior_strength = estimate_prior_strength(consultations[:-1], conversions[:-1])
+        self.prior_strength = prior_strength
+        # The last segment row pools everything and scores unseen segments.
+        consultations[-1] = consultations[:-1].sum(axis=0)
+        conversions[-1] = conversions[:-1].sum(axis=0)
+
+        self.scores = self._shrink(consultations, conversions)
+
+    @classmethod
+    def from_analyzer(cls, analyzer, **kwargs):
+        return cls(analyzer.backend.aggregate(
+            SEGMENT_KEYS + ['target_class', 'slot_hour'], ['consultations', 'conversions']
+        ), **kwargs)
+
+    @classmethod
+    def from_rows(cls, rows, **kwargs):
+        """Fit on consultation rows (segment keys, target_class, slot_hour, user_id, conversion_flag)."""
+        return cls(rows.groupby(SEGMENT_KEYS + ['target_class', 'slot_hour'], observed=True).agg(
+            consultations=('user_id', 'count'), conversions=('conversion_flag', 'sum')
+        ).reset_index(), **kwargs)
+
+    def _shrink(self, consultations, conversions):
+        m = self.prior_strength
+        segment_rate = conversions.sum(axis=(1, 2)) / np.maximum(consultations.sum(axis=(1, 2)), 1)
+        segment_hour_rate = (conversions.sum(axis=1) + m * segment_rate[:, None]) / (consultations.sum(axis=1) + m)
+        return (conversions + m * segment_hour_rate[:, None, :]) / (consultations + m)
+
+    def score_matrix(self):
+        """Expected conversion probability as a long frame, one row per (segment, class, hour)."""
+        segments = self.segments.to_frame(index=False)
+        segments.loc[len(segments)] = ['*', '*']
+        s, k, h = np.indices(self.scores.shape).reshape(3, -1)
+        frame = segments.iloc[s].reset_index(drop=True)
+        frame['target_class'] = self.classes.take(k)
+        frame['slot_hour'] = h
+        frame['expected_conversion_rate'] = self.scores.ravel()
+        return frame
+
+    def _encode_leads(self, leads):
+        s = self.segments.get_indexer(pd.MultiIndex.from_frame(leads[SEGMENT_KEYS].astype(str)))
+        s = np.where(s < 0, len(self.segments), s)
+        h = pd.to_numeric(leads['slot_hour'], errors='coerce').to_numpy(dtype=np.float64)
+        valid = ~np.isnan(h)
+        return s, np.where(valid, h, 0).astype(np.int64), valid
+
+    def match(self, leads, capacity=None):
+        """Assign ``leads`` (funnel, lead_type, slot_hour[, target_class]) to coach classes.
+
+        ``capacity`` is a frame with target_class, slot_hour and capacity
+        columns. When omitted, each class keeps the number of leads it
+        currently handles per hour, so the uplift comes purely from
+        re-matching who talks to whom.
+
+        ``expected_uplift`` values both plans with the fitted scores. The
+        plan is chosen to maximize those same scores, so it stays optimistic
+        by whatever noise survives shrinkage; fit on history that excludes
+        the leads being matched (see ``main``) so their own outcomes are
+        not part of it.
+        """
+        s, h, valid = self._encode_leads(leads)
+        n_segments, n_classes = self.scores.shape[0], self.scores.shape[1]
+
+        if 'target_class' in leads.columns:
+            current = self.classes.get_indexer(leads['target_class'])
+        else:
+            current = np.full(len(leads), -1)
+
+        if capacity is None:
+            if (current[valid] < 0).any():
+                raise ValueError("capacity is required when leads lack a known current target_class")
+            cap = np.zeros((n_classes, HOURS), dtype=np.int64)
+            np.add.at(cap, (current[valid], h[valid]), 1)
+        else:
+            cap = np.zeros((n_classes, HOURS), dtype=np.int64)
+            k = self.classes.get_indexer(capacity['target_class'])
+            known = k >= 0
+            np.add.at(cap, (k[known], capacity['slot_hour'].to_numpy(dtype=np.int64)[known]),
+                      capacity['capacity'].to_numpy(dtype=np.int64)[known])
+
+        demand = np.zeros((n_segments, HOURS), dtype=np.int64)
+        np.add.at(demand, (s[valid], h[valid]), 1)
+
+        plan = np.zeros((n_segments, n_classes, HOURS), dtype=np.int64)
+        for hour in np.flatnonzero(demand.sum(axis=0)):
+            plan[:, :, hour] = _transport(demand[:, hour], cap[:, hour], self.scores[:, :, hour])
+
+        assigned = np.full(len(leads), -1)
+        order = np.flatnonzero(valid)
+        order = order[np.lexsort((h[order], s[order]))]
+        group_starts = np.r_[0, np.flatnonzero(np.diff(s[order] * HOURS + h[order])) + 1]
+        for start in group_starts:
+            seg, hour = s[order[start]], h[order[start]]
+            classes = np.repeat(np.arange(n_classes), plan[seg, :, hour])
+            rows = order[start:start + demand[seg, hour]]
+            assigned[rows[:len(classes)]] = classes
+
+        matched = leads.copy()
+        matched['matched_class'] = np.where(assigned >= 0, self.classes.to_numpy()[np.maximum(assigned, 0)], None)
+        matched['expected_conversion_rate'] = np.where(assigned >= 0, self.scores[s, np.maximum(assigned, 0), h], np.nan)
+
+        has_current = valid & (current >= 0)
+        expected_current = self.scores[s[has_current], current[has_current], h[has_current]].sum()
+        expected_matched = self.scores[s[assigned >= 0], assigned[assigned >= 0], h[assigned >= 0]].sum()
+        report = {
+            'leads': int(len(leads)),
+            'assigned': int((assigned >= 0).sum()),
+            'unassigned': int(valid.sum() - (assigned >= 0).sum()),
+            'expected_conversions_current': float(expected_current),
+            'expected_conversions_matched': float(expected_matched),
+            'expected_uplift': float(expected_matched - expected_current),
+            'expected_uplift_pct': float((expected_matched / expected_current - 1) * 100) if expected_current else 0.0,
+        }
+        return matched, report
+
+
+def _transport(supply, capacity, scores):
+    """Maximize sum(x * scores) with row sums <= supply and column sums <= capacity.
+
+    Successive shortest paths (Bellman-Ford on the residual graph) over the
+    tiny segment x class network; each augmentation moves the bottleneck
+    amount, so the loop count is bounded by the number of cells, not leads.
+    """
+    n_rows, n_cols = scores.shape
+    source, sink = n_rows + n_cols, n_rows + n_cols + 1
+    n_nodes = sink + 1
+
+    residual = np.zeros((n_nodes, n_nodes), dtype=np.int64)
+    cost = np.zeros((n_nodes, n_nodes))
+    residual[source, :n_rows] = supply
+    residual[:n_rows, n_rows:n_rows + n_cols] = supply.sum()
+    residual[n_rows:n_rows + n_cols, sink] = capacity
+    cost[:n_rows, n_rows:n_rows + n_cols] = -scores
+    cost[n_rows:n_rows + n_cols, :n_rows] = scores.T
+
+    while True:
+        dist = np.full(n_nodes, np.inf)
+        dist[source] = 0.0
+        parent = np.full(n_nodes, -1)
+        for _ in range(n_nodes - 1):
+            candidate = np.where(residual > 0, dist[:, None] + cost, np.inf)
+            best_from = candidate.argmin(axis=0)
+            best = candidate[best_from, np.arange(n_nodes)]
+            improved = best < dist - 1e-12
+            if not improved.any():
+                break
+            dist[improved] = best[improved]
+            parent[improved] = best_from[improved]
+        if not np.isfinite(dist[sink]):
+            break
+
+        path, node = [], sink
+        while node != source:
+            path.append((parent[node], node))
+            node = parent[node]
+        amount = min(residual[u, v] for u, v in path)
+        for u, v in path:
+            residual[u, v] -= amount
+            residual[v, u] += amount
+
+    return residual[n_rows:n_rows + n_cols, :n_rows].T
+
+
+def main(file_path, day=None):
+    from iScale_Analysis_clean import iScaleAnalyzer
+
+    analyzer = iScaleAnalyzer(file_path)
+    if not analyzer.load_and_process_data():
+        print("❌ Error loading data.")
+        return None
+
+    rows = analyzer.backend.columns(
+        SEGMENT_KEYS + ['target_class', 'slot_hour', 'slot_start_time', 'user_id', 'conversion_flag']
+    )
+    rows = rows.dropna(subset=['slot_start_time'])
+    day = pd.Timestamp(day).normalize() if day else rows['slot_start_time'].max().normalize()
+    # Scores come only from earlier days, so the day's own outcomes can't flatter the plan
+    history = rows[rows['slot_start_time'] < day]
+    if history.empty:
+        print(f"❌ No consultations before {day.date()} to learn from.")
+        return None
+    matcher = CoachLeadMatcher.from_rows(history)
+    leads = rows.loc[rows['slot_start_time'].dt.normalize() == day, SEGMENT_KEYS + ['target_class', 'slot_hour']]
+
+    matched, report = matcher.match(leads)
+    print(f"🎯 Coach-lead matching for {day.date()}: {report['leads']:,} leads")
+    print(f"📊 Expected conversions (current): {report['expected_conversions_current']:.1f}")
+    print(f"🚀 Expected conversions (matched): {report['expected_conversions_matched']:.1f} "
+          f"({report['expected_uplift_pct']:+.1f}%)")
+    return matched, report
+
+
+if __name__ == "__main__":
+    default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'iScale_MaskedData.csv')
+    main(sys.argv[1] if len(sys.argv) > 1 else default_path, sys.argv[2] if len(sys.argv) > 2 else None)
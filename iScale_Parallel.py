@@ -0,0 +1,493 @@
+import glob
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from iScale_Backend import MEASURES, PandasBackend, _as_values, _is_parquet, quality_report, verify_backend_parity
+from iScale_Features import CONSULTATION_KEY, DATETIME_COLUMNS
+from iScale_Journey import JOURNEY_COLUMNS, build_user_journeys
+
+# Every column the analyses group or filter by. One partial cube over all
+# of them answers any aggregate on a subset of these keys by summing.
+CUBE_KEYS = ['funnel', 'lead_type', 'target_class', 'expert_id', 'slot_hour', 'slot_month']
+CUBE_MEASURES = ['rows', 'consultations', 'conversions', 'connected', 'completed']
+# Categorical keys are re-encoded with sorted categories after merging,
+# exactly as the single-process feature registry builds them.
+CATEGORICAL_KEYS = ['lead_type', 'slot_month']
+NUMERIC_KINDS = {'integer', 'floating', 'mixed-integer-float', 'decimal'}
+MIN_PARTITION_BYTES = 8 << 20
+# Shard rows also carry every other cube key (and so the whole
+# CONSULTATION_KEY), so any subset the cube answers can be filtered down to
+# its users as well.
+JOURNEY_ROW_COLUMNS = JOURNEY_COLUMNS + [key for key in CUBE_KEYS if key not in JOURNEY_COLUMNS]
+# Global row order = partition index in the high bits, row within it below.
+_ORDER_BITS = 40
+
+
+def _csv_ranges(path, n_partitions):
+    """Header plus byte ranges of the body, each ending on a line boundary.
+
+    Records must not contain quoted newlines; the masked extracts never do.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.readline()
+        body_start = f.tell()
+        bounds = [body_start]
+        for k in range(1, n_partitions):
+            f.seek(body_start + (size - body_start) * k // n_partitions)
+            f.readline()
+            bounds.append(max(f.tell(), bounds[-1]))
+    bounds.append(size)
+    return header, [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def plan_partitions(paths, n_partitions):
+    """Split files into independently readable pieces: CSV byte ranges or Parquet row groups."""
+    sizes = {path: os.path.getsize(path) for path in paths}
+    total = max(sum(sizes.values()), 1)
+    partitions = []
+    for path in paths:
+        if _is_parquet(path):
+            import pyarrow.parquet as pq
+            groups = pq.ParquetFile(path).metadata.num_row_groups
+            partitions += [('parquet', path, group) for group in range(groups)] or [('parquet', path, None)]
+        else:
+            n = max(1, min(round(n_partitions * sizes[path] / total), sizes[path] // MIN_PARTITION_BYTES))
+            header, ranges = _csv_ranges(path, n)
+            partitions += [('csv', path, header, start, end) for start, end in ranges]
+    return partitions
+
+
+def read_partition(partition, dtype=None):
+    if partition[0] == 'parquet':
+        _, path, group = partition
+        if group is None:
+            return pd.read_parquet(path)
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).read_row_groups([group]).to_pandas()
+    _, path, header, start, end = partition
+    with open(path, 'rb') as f:
+        f.seek(start)
+        body = f.read(end - start)
+    # low_memory=False: a column's type is inferred from all of its values at once
+    return pd.read_csv(io.BytesIO(header + body), low_memory=False, dtype=dtype)
+
+
+def _shard_of(user_ids, n_shards):
+    # Equal ids must land in the same shard whatever dtype each partition
+    # inferred, so numeric ids are hashed as float64.
+    values = user_ids.to_numpy()
+    if pd.api.types.is_numeric_dtype(user_ids.dtype):
+        values = values.astype(np.float64)
+    else:
+        values = values.astype(str)
+    return (pd.util.hash_array(values) % np.uint64(n_shards)).astype(np.int64)
+
+
+class PartialState:
+    """Mergeable summary of a slice of consultation rows.
+
+    Counts and sums live in a cube over CUBE_KEYS, payment lags in a
+    histogram. Journeys, distinct users and duplicate consultation keys
+    need every row of a user together, so those rows are written to
+    user-hash shard files where they are mapped and the state only lists
+    the files of each shard. Since user_id is part of CONSULTATION_KEY, a
+    duplicate never spans two shards, and each shard reduces independently
+    (``reduce_shard``). ``merge`` is associative and commutative; row order
+    is carried explicitly.
+    """
+
+    def __init__(self, partitions, kinds, cube, lags, quality, shards):
+        self.partitions = partitions
+        self.kinds = kinds
+        self.cube = cube
+        self.lags = lags
+        self.quality = quality
+        self.shards = shards
+
+    def merge(self, other):
+        return merge_states([self, other])
+
+
+def map_partition(index, partition, n_shards, spill_dir, dtype=None):
+    """Partial state of one partition, computed with the single-process feature code.
+
+    The partition's rows for each user shard are written under ``spill_dir``.
+    """
+    raw = read_partition(partition, dtype)
+    kinds = {col: pd.api.types.infer_dtype(raw[col], skipna=True)
+             for col in raw.columns if col not in DATETIME_COLUMNS}
+
+    backend = PandasBackend()
+    backend.prepare(raw)
+    measure_columns = [MEASURES[m][0] for m in CUBE_MEASURES if m != 'rows']
+    df = backend.require(*CUBE_KEYS, *measure_columns, 'conversion_days')
+
+    values = pd.DataFrame({key: df[key] for key in CUBE_KEYS})
+    values['rows'] = np.int64(1)
+    values['consultations'] = df['user_id'].notna().astype(np.int64)
+    for measure in ['conversions', 'connected', 'completed']:
+        values[measure] = df[MEASURES[measure][0]].astype(np.int64)
+    cube = values.groupby(CUBE_KEYS, dropna=False, observed=True, sort=False).sum().reset_index()
+
+    lagged = df['conversion_days'].notna()
+    lags = values.loc[lagged, CUBE_KEYS].assign(conversion_days=df.loc[lagged, 'conversion_days'], rows=np.int64(1))
+    lags = lags.groupby(CUBE_KEYS + ['conversion_days'], dropna=False, observed=True, sort=False).sum().reset_index()
+
+    rows = df[JOURNEY_ROW_COLUMNS].assign(_order=(np.int64(index) << _ORDER_BITS) + df.index.to_numpy(dtype=np.int64))
+    shard = _shard_of(rows['user_id'], n_shards)
+    shards = []
+    for s in range(n_shards):
+        path = os.path.join(spill_dir, f'shard-{s:04d}-partition-{index:06d}.pkl')
+        rows[shard == s].to_pickle(path)
+        shards.append([path])
+
+    quality = backend.quality
+    return PartialState(
+        partitions=[index],
+        kinds={col: {kind} for col, kind in kinds.items()},
+        cube=cube,
+        lags=lags,
+        quality={
+            'rows': quality['rows'],
+            'null_counts': quality['null_counts'],
+            'coerced_to_null': quality['coerced_to_null'],
+            'unknown_values': quality['unknown_values'],
+            'negative_conversion_lags': quality['negative_conversion_lags'],
+        },
+        shards=shards,
+    )
+
+
+def _sum_counts(dicts):
+    total = {}
+    for counts in dicts:
+        for key, count in counts.items():
+            total[key] = total.get(key, 0) + count
+    return total
+
+
+def merge_states(states):
+    """Reduce any number of partial states into one."""
+    if len(states) == 1:
+        return states[0]
+    sum_by = lambda frames, keys: (pd.concat(frames, ignore_index=True)
+                                   .groupby(keys, dropna=False, observed=True, sort=False).sum().reset_index())
+    columns = set().union(*(state.kinds for state in states))
+    unknown = {}
+    for state in states:
+        for col, counts in state.quality['unknown_values'].items():
+            unknown[col] = _sum_counts([unknown.get(col, {}), counts])
+    return PartialState(
+        partitions=sorted(p for state in states for p in state.partitions),
+        kinds={col: set().union(*(state.kinds.get(col, set()) for state in states)) for col in columns},
+        cube=sum_by([state.cube for state in states], CUBE_KEYS),
+        lags=sum_by([state.lags for state in states], CUBE_KEYS + ['conversion_days']),
+        quality={
+            'rows': sum(state.quality['rows'] for state in states),
+            'null_counts': _sum_counts(state.quality['null_counts'] for state in states),
+            'coerced_to_null': _sum_counts(state.quality['coerced_to_null'] for state in states),
+            'unknown_values': {col: dict(sorted(counts.items(), key=lambda item: -item[1]))
+                               for col, counts in unknown.items()},
+            'negative_conversion_lags': sum(state.quality['negative_conversion_lags'] for state in states),
+        },
+        shards=[[path for paths in shard for path in paths] for shard in zip(*(state.shards for state in states))],
+    )
+
+
+def conflicting_columns(states):
+    """Columns whose partitions inferred incompatible types, mapped to the partitions to re-read as text.
+
+    Reading the whole file at once would have turned such a column into
+    strings (e.g. True/False in one range and 'Maybe' in another), so those
+    partitions are mapped again with the column forced to str.
+    """
+    reread = {}
+    columns = set().union(*(state.kinds for state in states))
+    for col in columns:
+        kinds = {kind for state in states for kind in state.kinds.get(col, set())} - {'empty'}
+        if len(kinds) <= 1 or kinds <= NUMERIC_KINDS:
+            continue
+        for state in states:
+            if state.kinds.get(col, set()) - {'empty', 'string'}:
+                reread.setdefault(state.partitions[0], {})[col] = 'str'
+    return reread
+
+
+def reduce_shard(paths, string_keys, dtypes, filters=None):
+    """(journeys, duplicate consultations) of one user shard, read from its files.
+
+    Keys are encoded as on the merged cube first, so journeys carry the same
+    dtypes and ``filters`` match the same values. Journeys keep the ``_order``
+    of each user's first row for restoring global order.
+    """
+    rows = pd.concat([pd.read_pickle(path) for path in paths], ignore_index=True) if paths else \
+        pd.DataFrame(columns=JOURNEY_ROW_COLUMNS + ['_order'])
+    for key in string_keys:
+        rows[key] = rows[key].astype('str')
+    for key, dtype in dtypes.items():
+        rows[key] = rows[key].astype(str).where(rows[key].notna()).astype(dtype)
+    for column, values in (filters or {}).items():
+        rows = rows[rows[column].isin(_as_values(values)).to_numpy()]
+    duplicates = int(rows.duplicated(subset=[col for col in CONSULTATION_KEY if col in rows.columns]).sum())
+
+    rows = rows[rows['user_id'].notna()].sort_values('_order', kind='stable')
+    journeys = build_user_journeys(rows)
+    first_order = rows.drop_duplicates('user_id')['_order'].to_numpy(dtype=np.int64)
+    return journeys.assign(_order=first_order), duplicates
+
+
+def _concat_journeys(journeys):
+    # Empty shards come back untyped; leave them out unless nothing else is left
+    journeys = [frame for frame in journeys if len(frame)] or journeys[:1]
+    merged = pd.concat(journeys, ignore_index=True).sort_values('_order', kind='stable')
+    return merged.drop(columns='_order').reset_index(drop=True)
+
+
+class _SpillDirectory:
+    """Temporary directory of shard files, removed once no backend refers to it."""
+
+    def __init__(self):
+        self.path = tempfile.mkdtemp(prefix='iscale-shards-')
+        weakref.finalize(self, shutil.rmtree, self.path, True)
+
+
+def categorize_keys(cube, *frames):
+    """Encode CATEGORICAL_KEYS with the sorted categories found in ``cube``, as the feature registry does."""
+    dtypes = {}
+    for key in CATEGORICAL_KEYS:
+        dtypes[key] = pd.CategoricalDtype(sorted(cube[key].dropna().astype(str).unique()))
+        for frame in (cube, *frames):
+            frame[key] = frame[key].astype(str).where(frame[key].notna()).astype(dtypes[key])
+    return dtypes
+
+
+class CubeBackend:
+    """Backend over merged aggregate state rather than rows.
+
+    ``cube`` holds the CUBE_MEASURES per combination of CUBE_KEYS, ``lags``
+    the payment-lag histogram per cell, ``users`` the distinct user ids and
+    ``journeys`` one row per user. Aggregates re-sum cube cells; row-level
+    access (``columns``/``require``) is not available.
+    """
+    name = 'cube'
+    df = None
+
+    def __init__(self, cube=None, lags=None, users=None, journeys=None, quality=None):
+        self.cube = cube
+        self.lags = lags
+        self.users = users
+        self.quality = quality
+        self._journeys = journeys
+
+    @property
+    def loaded(self):
+        return self.cube is not None
+
+    def require(self, *features):
+        raise NotImplementedError(f"The {self.name} backend keeps merged aggregates only, not a row-level frame")
+
+    def columns(self, names):
+        raise NotImplementedError(f"The {self.name} backend keeps merged aggregates only, not a row-level frame")
+
+    def row_count(self):
+        return self.cube['rows'].sum()
+
+    def distinct_count(self, column):
+        if column == 'user_id' and self.users is not None:
+            return len(self.users)
+        if column not in CUBE_KEYS:
+            raise NotImplementedError(f"No distinct set is kept for '{column}'")
+        return self.cube.loc[self.cube['rows'] > 0, column].nunique()
+
+    def _within(self, keys, within_days):
+        lags = self.lags[(self.lags['conversion_days'] >= 0) & (self.lags['conversion_days'] <= int(within_days))]
+        if not keys:
+            return lags['rows'].sum()
+        return lags.groupby(keys, observed=True, sort=True)['rows'].sum()
+
+    def totals(self, measures, within_days=None):
+        totals = {}
+        for measure in measures:
+            totals[measure] = self._within([], within_days) if measure == 'conversions_within' else self.cube[measure].sum()
+        return totals
+
+    def aggregate(self, keys, measures, within_days=None):
+        unknown = set(keys) - set(CUBE_KEYS)
+        if unknown:
+            raise NotImplementedError(f"The {self.name} backend cannot group by {', '.join(sorted(unknown))}")
+        grouped = self.cube.groupby(keys, observed=True, sort=True)
+        result = grouped[['rows'] + [m for m in measures if m != 'conversions_within']].sum()
+        if 'conversions_within' in measures:
+            result['conversions_within'] = self._within(keys, within_days).reindex(result.index, fill_value=0)
+        return result[measures].astype(np.int64).reset_index()
+
+    def user_journeys(self):
+        if self._journeys is None:
+            raise NotImplementedError(f"The {self.name} backend has no journeys for this selection")
+        return self._journeys
+
+    def subset(self, filters):
+        raise NotImplementedError(f"The {self.name} backend cannot be filtered")
+
+    def memory_bytes(self):
+        frames = [self.cube, self.lags, self._journeys]
+        users = np.asarray(self.users).nbytes if self.users is not None else 0
+        return sum(int(f.memory_usage(deep=True).sum()) for f in frames if f is not None) + users
+
+
+class ParallelBackend(CubeBackend):
+    """Map-reduce execution: partitions are summarized in worker processes and merged.
+
+    Accepts one file, a glob, or a list of CSV/Parquet files. Every
+    aggregate is answered from the merged partial state and matches the
+    pandas backend exactly. User shards are reduced in the workers too; the
+    parent only ever holds cube cells, lag histograms and one row per user.
+    """
+    name = 'parallel'
+
+    def __init__(self, workers=None, partitions=None, shards=None):
+        super().__init__()
+        self.workers = workers or os.cpu_count() or 1
+        self.n_partitions = partitions or self.workers * 2
+        self.n_shards = shards or self.workers
+        self.shards = None
+        self.string_keys = []
+        self.filters = {}
+        self._spill = None
+
+    def _map(self, pool, partitions, dtypes):
+        indices = list(dtypes) if isinstance(dtypes, dict) else range(len(partitions))
+        args = [(i, partitions[i], self.n_shards, self._spill.path, dtypes.get(i) if isinstance(dtypes, dict) else None)
+                for i in indices]
+        if pool is None:
+            return [map_partition(*a) for a in args]
+        return list(pool.map(map_partition, *zip(*args)))
+
+    def load(self, file_path):
+        paths = [file_path] if not isinstance(file_path, (list, tuple)) else list(file_path)
+        paths = [match for path in paths for match in (sorted(glob.glob(str(path))) or [path])]
+        partitions = plan_partitions(paths, self.n_partitions)
+        self._spill = _SpillDirectory()
+
+        with ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else _NoPool() as pool:
+            states = self._map(pool, partitions, None)
+            reread = conflicting_columns(states)
+            if reread:
+                redone = {state.partitions[0]: state for state in self._map(pool, partitions, reread)}
+                states = [redone.get(state.partitions[0], state) for state in states]
+            state = merge_states(states)
+            self._adopt(state, pool)
+
+    @classmethod
+    def from_state(cls, state, workers=None):
+        """Backend over a state reduced elsewhere (e.g. partials gathered from several machines).
+
+        Its shard files must stay readable from here for as long as the
+        backend (and any subset of it) is used.
+        """
+        backend = cls(workers=workers)
+        with ProcessPoolExecutor(max_workers=backend.workers) if backend.workers > 1 else _NoPool() as pool:
+            backend._adopt(state, pool)
+        return backend
+
+    def _adopt(self, state, pool):
+        cube, lags = state.cube, state.lags
+        string_keys = [k for k in CUBE_KEYS if state.kinds.get(k, set()) - {'empty'} == {'string'}]
+        for frame in (cube, lags):
+            for key in string_keys:
+                frame[key] = frame[key].astype('str')
+        self.dtypes = categorize_keys(cube, lags)
+        self.string_keys = string_keys
+        self.shards = state.shards
+        self.lags = lags
+
+        args = (state.shards, repeat(string_keys), repeat(self.dtypes))
+        reduced = list(pool.map(reduce_shard, *args) if pool is not None else map(reduce_shard, *args))
+        self._journeys = _concat_journeys([journeys for journeys, _ in reduced])
+        self.users = self._journeys['user_id'].to_numpy()
+
+        quality = state.quality
+        self.quality = quality_report(quality['rows'], quality['null_counts'], quality['coerced_to_null'],
+                                      quality['unknown_values'], quality['negative_conversion_lags'],
+                                      sum(duplicates for _, duplicates in reduced))
+        self.cube = cube
+
+    def user_journeys(self):
+        if self._journeys is None and self.shards is not None:
+            # A subset's journeys: each shard is read and filtered on its own
+            self._journeys = _concat_journeys([
+                reduce_shard(paths, self.string_keys, self.dtypes, self.filters)[0] for paths in self.shards
+            ])
+        return super().user_journeys()
+
+    def distinct_count(self, column):
+        if column == 'user_id' and self.users is None and self.shards is not None:
+            self.users = self.user_journeys()['user_id'].to_numpy()
+        return super().distinct_count(column)
+
+    def subset(self, filters):
+        """Backend over the cube cells matching ``filters``; its journeys are reduced from the shards on request."""
+        unknown = set(filters) - set(CUBE_KEYS)
+        if unknown:
+            raise NotImplementedError(f"The parallel backend cannot filter on {', '.join(sorted(unknown))}")
+        subset = ParallelBackend(self.workers, self.n_partitions, self.n_shards)
+        subset.dtypes = self.dtypes
+        subset.string_keys = self.string_keys
+        subset.shards = self.shards
+        subset.filters = {**self.filters, **filters}
+        subset._spill = self._spill
+        cube_mask = np.ones(len(self.cube), dtype=bool)
+        lag_mask = np.ones(len(self.lags), dtype=bool)
+        for column, values in filters.items():
+            cube_mask &= self.cube[column].isin(_as_values(values)).to_numpy()
+            lag_mask &= self.lags[column].isin(_as_values(values)).to_numpy()
+        subset.lags = self.lags[lag_mask].reset_index(drop=True)
+        subset.cube = self.cube[cube_mask].reset_index(drop=True)
+        return subset
+
+
+class _NoPool:
+    """Stand-in for a process pool when running on one worker."""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+def main(file_path, workers=None):
+    from iScale_DA import iScaleDataAnalyzer
+    from iScale_Analysis_clean import iScaleAnalyzer
+
+    for backend in [PandasBackend(low_memory=False), ParallelBackend(workers=workers)]:
+        start = time.perf_counter()
+        backend.load(file_path)
+        print(f"⏱️ {backend.name}: loaded {backend.row_count():,} rows in {time.perf_counter() - start:.2f}s")
+
+    failed = False
+    for analyzer_cls in [iScaleDataAnalyzer, iScaleAnalyzer]:
+        mismatches = verify_backend_parity(analyzer_cls, file_path, backends=('pandas', 'parallel'))
+        failed |= bool(mismatches)
+        print(f"{'❌' if mismatches else '✅'} {analyzer_cls.__name__}: "
+              f"{len(mismatches)} mismatches" if mismatches else f"✅ {analyzer_cls.__name__}: parallel matches pandas")
+        for mismatch in mismatches:
+            print(f"   {mismatch}")
+    return not failed
+
+
+if __name__ == "__main__":
+    default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'iScale_MaskedData.csv')
+    path = sys.argv[1] if len(sys.argv) > 1 else default_path
+    sys.exit(0 if main(path, int(sys.argv[2]) if len(sys.argv) > 2 else None) else 1)
@@ -0,0 +1,212 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import plotly
+import plotly.io as pio
+
+import iScale_Charts as charts
+import iScale_Simulator
+from iScale_DA import iScaleDataAnalyzer
+
+MANIFEST_NAME = 'manifest.json'
+IMAGE_FORMATS = ('png', 'svg', 'pdf', 'jpeg', 'webp', 'html')
+# Modules whose code shapes a chart image: the builders and the simulation
+# the peak-hour charts are drawn from.
+BUILDER_MODULES = (charts, iScale_Simulator)
+
+
+def _update_digest(digest, value):
+    if isinstance(value, pd.DataFrame):
+        digest.update(value.to_json(orient='split', date_format='iso').encode())
+    elif isinstance(value, np.ndarray):
+        digest.update(f"{value.dtype}{value.shape}".encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        for key in sorted(value):
+            digest.update(str(key).encode())
+            _update_digest(digest, value[key])
+    else:
+        digest.update(repr(value).encode())
+
+
+def _builder_version():
+    # Editing a builder module or upgrading plotly invalidates every chart.
+    digest = hashlib.sha256(plotly.__version__.encode())
+    for module in BUILDER_MODULES:
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def chart_fingerprint(name, inputs, render_options, builder_version=None):
+    """Hash of everything that determines a chart's image."""
+    digest = hashlib.sha256()
+    _update_digest(digest, {
+        'chart': name,
+        'builder': builder_version or _builder_version(),
+        'options': render_options,
+        'inputs': inputs,
+    })
+    return digest.hexdigest()
+
+
+def segment_filters(analyzer, by=()):
+    """('all', {}) followed by one (label, filters) pair per value of each ``by`` column."""
+    yield 'all', {}
+    for column in by:
+        values = analyzer.analyze_distribution(column)[column]
+        for value in values.astype(object):
+            yield f"{column}={value}", {column: value}
+
+
+def _safe_name(label):
+    return re.sub(r'[^\w.=-]+', '_', str(label)).strip('_') or 'segment'
+
+
+def _render_batch(output_dir, jobs, image_format, width, scale):
+    """Build and export one worker's share of the charts; returns (path, fingerprint, error) per job."""
+    results, built, figures, paths = [], [], [], []
+    for path, name, inputs, fingerprint in jobs:
+        full_path = os.path.join(output_dir, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        try:
+            figures.append(charts.build_chart(name, inputs))
+        except Exception as e:
+            # One bad figure is recorded as failed; the rest still export
+            results.append((path, fingerprint, str(e)))
+            continue
+        built.append((path, fingerprint))
+        paths.append(full_path)
+
+    try:
+        if image_format == 'html':
+            for fig, path in zip(figures, paths):
+                fig.write_html(path, include_plotlyjs='cdn')
+        elif figures:
+            # One export call per batch so the renderer starts once per worker
+            pio.write_images(figures, paths, format=image_format, width=width, scale=scale)
+    except Exception as e:
+        return results + [(path, fingerprint, str(e)) for path, fingerprint in built]
+    return results + [(path, fingerprint, None) for path, fingerprint in built]
+
+
+def _load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def render_report(datasets, output_dir='reports', by=(), chart_names=None, backend='pandas',
+                  workers=None, image_format='png', width=1200, scale=2, force=False):
+    """Render every dashboard chart for each dataset and segment into ``output_dir``.
+
+    ``datasets`` maps names to CSV/Parquet paths. Chart inputs are computed
+    here, then figures are built and exported across a process pool. Charts
+    whose fingerprint matches the manifest from the last run are skipped.
+    Output goes to ``<output_dir>/<dataset>/<segment>/<chart>.<format>``.
+    """
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"image_format must be one of {IMAGE_FORMATS}")
+    chart_names = list(chart_names or charts.CHARTS)
+    render_options = {'format': image_format, 'width': width, 'scale': scale}
+    builder_version = _builder_version()
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _load_manifest(output_dir)
+
+    jobs, skipped, failed = [], [], []
+    for dataset, file_path in datasets.items():
+        analyzer = iScaleDataAnalyzer(file_path, backend=backend)
+        if not analyzer.load_and_process_data():
+            failed.append((dataset, "could not load data"))
+            continue
+
+        for label, filters in segment_filters(analyzer, by):
+            segment = analyzer.subset(**filters) if filters else analyzer
+            if segment.backend.row_count() == 0:
+                continue
+            for name in chart_names:
+                path = os.path.join(_safe_name(dataset), _safe_name(label), f"{name}.{image_format}")
+                try:
+                    inputs = charts.chart_inputs(segment, name)
+                except Exception as e:
+                    failed.append((path, str(e)))
+                    continue
+                fingerprint = chart_fingerprint(name, inputs, render_options, builder_version)
+                if not force and manifest.get(path) == fingerprint and os.path.exists(os.path.join(output_dir, path)):
+                    skipped.append(path)
+                else:
+                    jobs.append((path, name, inputs, fingerprint))
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+    batches = [jobs[i::workers] for i in range(workers)] if jobs else []
+    if workers == 1:
+        results = [_render_batch(output_dir, batch, image_format, width, scale) for batch in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_render_batch, [output_dir] * len(batches), batches,
+                                    [image_format] * len(batches), [width] * len(batches), [scale] * len(batches)))
+
+    rendered = []
+    for path, fingerprint, error in (result for batch in results for result in batch):
+        if error:
+            failed.append((path, error))
+            manifest.pop(path, None)
+        else:
+            rendered.append(path)
+            manifest[path] = fingerprint
+    _save_manifest(output_dir, manifest)
+
+    print(f"✅ Rendered {len(rendered)} charts ({len(skipped)} unchanged) into {output_dir}")
+    for path, error in failed:
+        print(f"❌ {path}: {error}")
+    return {'rendered': rendered, 'skipped': skipped, 'failed': failed}
+
+
+def parse_datasets(entries):
+    """``name=path`` or bare paths (named after the file) -> {name: path}."""
+    datasets = {}
+    for entry in entries:
+        name, sep, path = entry.partition('=')
+        if not sep:
+            name, path = os.path.splitext(os.path.basename(entry))[0], entry
+        datasets[name] = path
+    return datasets
+
+
+def main(argv=None):
+    default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'iScale_MaskedData.csv')
+    parser = argparse.ArgumentParser(description="Render the dashboard charts as static images.")
+    parser.add_argument('datasets', nargs='*', default=[default_path], help="CSV/Parquet paths or name=path")
+    parser.add_argument('--by', action='append', default=[], help="also render one set per value of this column "
+                                                                  "(e.g. funnel, slot_month); repeatable")
+    parser.add_argument('--charts', nargs='+', choices=list(charts.CHARTS), help="subset of charts to render")
+    parser.add_argument('--out', default='reports', help="output directory")
+    parser.add_argument('--format', default='png', choices=IMAGE_FORMATS)
+    parser.add_argument('--workers', type=int, default=None, help="render processes (default: CPU count)")
+    parser.add_argument('--backend', default=os.environ.get('ISCALE_BACKEND', 'pandas'))
+    parser.add_argument('--force', action='store_true', help="re-render charts even if inputs are unchanged")
+    args = parser.parse_args(argv)
+
+    report = render_report(parse_datasets(args.datasets), args.out, by=args.by, chart_names=args.charts,
+                           backend=args.backend, workers=args.workers, image_format=args.format, force=args.force)
+    return not report['failed']
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
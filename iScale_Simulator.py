@@ -0,0 +1,196 @@
+import numpy as np
+import pandas as pd
+
+SEGMENT_KEYS = ['funnel', 'lead_type']
+HOURS = 24
+# analyze_hourly_performance names the connectivity count differently per analyzer
+CONNECTED_COLUMNS = ('connectivity_flag', 'current_status')
+RATE_COLUMNS = {'connections': 'connectivity_rate_mean', 'conversions': 'conversion_rate_mean'}
+# Upper bound on simulated (draw x policy x segment x hour) cells held at once
+_MAX_CELLS_PER_BATCH = 4_000_000
+# Floor on estimated prior strengths: at least one pseudo-observation of the
+# group rate, so sparse or wildly varying cells keep proper Beta parameters
+MIN_PRIOR_STRENGTH = 1.0
+
+
+def round_preserving_total(allocation):
+    """Round along the hour axis to integers without changing each row's total."""
+    allocation = np.asarray(allocation, dtype=np.float64)
+    floor = np.floor(allocation)
+    shortfall = np.rint(allocation.sum(axis=-1) - floor.sum(axis=-1)).astype(np.int64)
+    order = np.argsort(floor - allocation, axis=-1, kind='stable')
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.arange(allocation.shape[-1]), axis=-1)
+    return (floor + (rank < shortfall[..., None])).astype(np.int64)
+
+
+def estimate_prior_strength(trials, successes, axis=1):
+    """Method-of-moments strength m of a Beta(m * p, m * (1 - p)) prior around group rates.
+
+    A group is every cell sharing an index off ``axis`` (a segment's hours,
+    or a segment-hour's coach classes), and p is its pooled rate. Under the
+    prior, n * (rate - p)^2 / (p * (1 - p)) has expectation
+    1 + (n - 1) / (m + 1) per cell; whatever the observed spread leaves above
+    pure binomial noise is the between-cell variance. No excess means no
+    evidence that cells differ, and they pool completely. The estimate is
+    clipped to [MIN_PRIOR_STRENGTH, total trials]: sparse cells can show a
+    between-cell variance of 1 or more, which means almost no shrinkage,
+    not a negative prior.
+    """
+    trials = np.asarray(trials, dtype=np.float64)
+    successes = np.asarray(successes, dtype=np.float64)
+    totals = trials.sum(axis=axis, keepdims=True)
+    p = np.broadcast_to(successes.sum(axis=axis, keepdims=True) / np.maximum(totals, 1), trials.shape)
+    pooled = float(max(trials.sum(), MIN_PRIOR_STRENGTH))
+    cells = (trials > 0) & (p > 0) & (p < 1)
+    if not cells.any():
+        return pooled
+    n = trials[cells]
+    spread = (n * (successes[cells] / n - p[cells]) ** 2 / (p[cells] * (1 - p[cells]))).sum()
+    # one degree of freedom per group goes to estimating its rate
+    excess = spread - (cells.sum() - cells.any(axis=axis).sum())
+    between = excess / max((n - 1).sum(), 1)
+    if between <= 0:
+        return pooled
+    return float(np.clip(1 / between - 1, MIN_PRIOR_STRENGTH, pooled))
+
+
+def _mix(weights, mask):
+    # Normalized share of each masked hour; uniform over the mask when a
+    # segment has no history there.
+    weights = np.where(mask, weights, 0.0)
+    weights = np.where(weights.sum(axis=1, keepdims=True) > 0, weights, mask.astype(np.float64))
+    sums = weights.sum(axis=1, keepdims=True)
+    return weights / np.where(sums > 0, sums, 1)
+
+
+class SlotPolicySimulator:
+    """Monte Carlo what-if for hourly slot allocations per segment.
+
+    Each (segment, hour) connectivity and conversion rate gets a Beta
+    posterior from its historical counts, shrunk towards the segment's
+    overall rate. Unless given, the prior strength is estimated from how
+    much the hourly rates actually vary beyond binomial noise (empirical
+    Bayes), so peak hours picked from pure noise are shrunk back to the
+    segment rate instead of promising uplift. One simulation samples rates
+    for every cell and then binomial outcomes for every candidate policy at
+    once, reusing the same rate draws across policies so their differences
+    are not sampling noise.
+    """
+
+    def __init__(self, hourly_stats, segment_keys=SEGMENT_KEYS, prior_strength=None, seed=None):
+        self.segment_keys = list(segment_keys)
+        connected = next(c for c in CONNECTED_COLUMNS if c in hourly_stats.columns)
+        stats = hourly_stats.dropna(subset=self.segment_keys + ['slot_hour'])
+
+        segments = stats[self.segment_keys].astype(str).drop_duplicates().sort_values(self.segment_keys)
+        self.segments = pd.MultiIndex.from_frame(segments.reset_index(drop=True))
+        s = self.segments.get_indexer(pd.MultiIndex.from_frame(stats[self.segment_keys].astype(str)))
+        h = stats['slot_hour'].to_numpy(dtype=np.int64)
+
+        shape = (len(self.segments), HOURS)
+        self.consultations = np.zeros(shape)
+        self.connected = np.zeros(shape)
+        self.conversions = np.zeros(shape)
+        np.add.at(self.consultations, (s, h), stats['user_id'].to_numpy(dtype=np.float64))
+        np.add.at(self.connected, (s, h), stats[connected].to_numpy(dtype=np.float64))
+        np.add.at(self.conversions, (s, h), stats['conversion_flag'].to_numpy(dtype=np.float64))
+
+        self.connect_alpha, self.connect_beta = self._posterior(self.connected, prior_strength)
+        self.convert_alpha, self.convert_beta = self._posterior(self.conversions, prior_strength)
+        self.seed = seed
+
+    @classmethod
+    def from_analyzer(cls, analyzer, segment_keys=SEGMENT_KEYS, **kwargs):
+        return cls(analyzer.analyze_hourly_performance(by=segment_keys), segment_keys, **kwargs)
+
+    def _segment_rate(self, successes):
+        totals = self.consultations.sum(axis=1, keepdims=True)
+        return np.where(totals > 0, successes.sum(axis=1, keepdims=True) / np.maximum(totals, 1), 0.5)
+
+    def _posterior(self, successes, prior_strength):
+        if prior_strength is None:
+            prior_strength = estimate_prior_strength(self.consultations, successes)
+        segment_rate = self._segment_rate(successes)
+        alpha = successes + prior_strength * segment_rate + 1e-9
+        beta = self.consultations - successes + prior_strength * (1 - segment_rate) + 1e-9
+        return alpha, beta
+
+    def current_allocation(self, volume=None):
+        """Historical hourly mix per segment, optionally rescaled to ``volume`` consultations."""
+        allocation = self.consultations.copy()
+        if volume is not None:
+            allocation *= volume / max(allocation.sum(), 1)
+        return round_preserving_total(allocation)
+
+    def peak_hour_policies(self, peak_shares, n_peak_hours=3, volume=None, rank_by='conversion'):
+        """One policy per share: that share of each segment's volume goes to its top hours.
+
+        Peak hours are ranked per segment by posterior mean rate; the rest
+        of the volume keeps the historical off-peak mix.
+        """
+        current = self.consultations * ((volume / max(self.consultations.sum(), 1)) if volume else 1.0)
+        alpha, beta = ((self.convert_alpha, self.convert_beta) if rank_by == 'conversion'
+                       else (self.connect_alpha, self.connect_beta))
+        mean_rate = np.where(self.consultations > 0, alpha / (alpha + beta), -np.inf)
+        peak = np.zeros_like(current, dtype=bool)
+        np.put_along_axis(peak, np.argsort(-mean_rate, axis=1, kind='stable')[:, :n_peak_hours], True, axis=1)
+
+        totals = current.sum(axis=1, keepdims=True)
+        peak_mix, off_mix = _mix(current, peak), _mix(current, ~peak)
+        shares = np.asarray(peak_shares, dtype=np.float64)[:, None, None]
+        return round_preserving_total(totals * (shares * peak_mix + (1 - shares) * off_mix))
+
+    def simulate(self, allocations, draws=1000, rng=None):
+        """Simulated connections/conversions per policy, shape (draws, policies) each.
+
+        Each call draws from a fresh generator seeded with ``self.seed``
+        (or from ``rng``), so a shared simulator gives repeatable numbers.
+        """
+        rng = rng if rng is not None else np.random.default_rng(self.seed)
+        allocations = np.asarray(allocations, dtype=np.int64)
+        if allocations.ndim == 2:
+            allocations = allocations[None]
+        n_policies = allocations.shape[0]
+        batch = max(1, _MAX_CELLS_PER_BATCH // max(allocations.size, 1))
+
+        connections = np.empty((draws, n_policies), dtype=np.int64)
+        conversions = np.empty((draws, n_policies), dtype=np.int64)
+        for start in range(0, draws, batch):
+            n = min(batch, draws - start)
+            connect_rate = rng.beta(self.connect_alpha, self.connect_beta, size=(n, 1) + self.consultations.shape)
+            convert_rate = rng.beta(self.convert_alpha, self.convert_beta, size=(n, 1) + self.consultations.shape)
+            trials = np.broadcast_to(allocations[None], (n,) + allocations.shape)
+            connections[start:start + n] = rng.binomial(trials, connect_rate).sum(axis=(2, 3))
+            conversions[start:start + n] = rng.binomial(trials, convert_rate).sum(axis=(2, 3))
+        return {'connections': connections, 'conversions': conversions,
+                'consultations': allocations.sum(axis=(1, 2))}
+
+    def summarize(self, simulation, labels=None, quantiles=(0.05, 0.5, 0.95)):
+        consultations = simulation['consultations']
+        rows = {'policy': labels if labels is not None else np.arange(len(consultations)),
+                'consultations': consultations}
+        for metric in ['connections', 'conversions']:
+            values = simulation[metric]
+            rows[f'{metric}_mean'] = values.mean(axis=0)
+            for q, level in zip(quantiles, np.quantile(values, quantiles, axis=0)):
+                rows[f'{metric}_p{int(q * 100)}'] = level
+            rows[RATE_COLUMNS[metric]] = values.mean(axis=0) / np.maximum(consultations, 1) * 100
+        return pd.DataFrame(rows)
+
+    def compare_peak_share(self, peak_share=0.7, n_peak_hours=3, volume=None, draws=1000, rng=None):
+        """Current mix vs. moving ``peak_share`` of volume into peak hours."""
+        policies = np.concatenate([
+            self.current_allocation(volume)[None],
+            self.peak_hour_policies([peak_share], n_peak_hours, volume)
+        ])
+        simulation = self.simulate(policies, draws, rng)
+        summary = self.summarize(simulation, labels=['current', f'{int(peak_share * 100)}% peak'])
+        uplift = simulation['conversions'][:, 1] - simulation['conversions'][:, 0]
+        return summary, {
+            'uplift_mean': float(uplift.mean()),
+            'uplift_p5': float(np.quantile(uplift, 0.05)),
+            'uplift_p95': float(np.quantile(uplift, 0.95)),
+            'probability_better': float((uplift > 0).mean()),
+            'uplift_draws': uplift
+        }
@@ -1,16 +1,21 @@
 import streamlit as st
+import pandas as pd
 import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import sys
 import os
 import json
+import glob
 import warnings
 warnings.filterwarnings('ignore')
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from iScale_DA import iScaleDataAnalyzer
+from iScale_Backend import BACKENDS, get_backend, quality_issues
+from iScale_Cache import AnalyzerCache, CachedBackend, QueryCache, normalize_filters
+from iScale_Live import LiveBackend
+from iScale_Simulator import SlotPolicySimulator
+import iScale_Charts as charts
 
 st.set_page_config(
     page_title="iScale Visual Analytics by Abeer Kapoor",
@@ -79,6 +84,42 @@ st.markdown("""
 
 CSV_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'iScale_MaskedData.csv')
 JSON_RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'iScale_analysis_results.json')
+DEFAULT_BACKEND = os.environ.get('ISCALE_BACKEND', 'pandas')
+# Extra datasets: ISCALE_DATASETS="May=/data/may.csv;June=/data/june.parquet",
+# otherwise every CSV/Parquet file in ISCALE_DATA_DIR (default: next to this file)
+DATA_DIR = os.environ.get('ISCALE_DATA_DIR', os.path.dirname(os.path.abspath(__file__)))
+ANALYZER_CACHE_MB = int(os.environ.get('ISCALE_CACHE_MB', 2048))
+QUERY_CACHE_MB = int(os.environ.get('ISCALE_QUERY_CACHE_MB', 256))
+# Live Monitor sources: an append-only NDJSON event log and/or a TCP port.
+# The port takes unauthenticated events, so it listens on loopback unless
+# ISCALE_EVENT_HOST says otherwise.
+EVENT_LOG = os.environ.get('ISCALE_EVENT_LOG')
+EVENT_PORT = os.environ.get('ISCALE_EVENT_PORT')
+EVENT_HOST = os.environ.get('ISCALE_EVENT_HOST', '127.0.0.1')
+LIVE_REFRESH_SECONDS = float(os.environ.get('ISCALE_LIVE_REFRESH', 5))
+# Sidebar filters: column -> label
+FILTER_COLUMNS = {
+    'funnel': "Funnel",
+    'lead_type': "Lead Type",
+    'target_class': "Coach Class",
+    'slot_month': "Slot Month",
+}
+
+def discover_datasets():
+    """Map dataset names to file paths, the default extract first"""
+    datasets = {}
+    if os.path.exists(CSV_FILE_PATH):
+        datasets[os.path.splitext(os.path.basename(CSV_FILE_PATH))[0]] = CSV_FILE_PATH
+    configured = os.environ.get('ISCALE_DATASETS')
+    if configured:
+        for entry in filter(None, (part.strip() for part in configured.split(';'))):
+            name, _, path = entry.partition('=')
+            datasets[name.strip()] = path.strip()
+    else:
+        for pattern in ('*.csv', '*.parquet'):
+            for path in sorted(glob.glob(os.path.join(DATA_DIR, pattern))):
+                datasets.setdefault(os.path.splitext(os.path.basename(path))[0], path)
+    return datasets
 
 @st.cache_data
 def load_analysis_results():
@@ -91,11 +132,29 @@ def load_analysis_results():
         st.warning(f"Could not load pre-computed results: {str(e)}")
         return None
 
-@st.cache_data
-def load_analyzer():
-    """Load and initialize the iScale analyzer with data"""
+@st.cache_resource
+def get_analyzer_cache():
+    """Process-wide LRU of loaded analyzers, bounded by ISCALE_CACHE_MB"""
+    return AnalyzerCache(_load_analyzer, ANALYZER_CACHE_MB * 1024 ** 2)
+
+@st.cache_resource
+def get_query_cache():
+    """Process-wide cache of query results per dataset version and filter set, bounded by ISCALE_QUERY_CACHE_MB"""
+    return QueryCache(QUERY_CACHE_MB * 1024 ** 2)
+
+def load_analyzer(file_path=CSV_FILE_PATH, backend=DEFAULT_BACKEND):
+    """Cached analyzer for a dataset; a changed file gets a fresh entry"""
     try:
-        analyzer = iScaleDataAnalyzer(CSV_FILE_PATH)
+        key = (os.path.abspath(file_path), backend, os.path.getmtime(file_path))
+    except OSError as e:
+        st.error(f"Dataset not found: {str(e)}")
+        return None
+    return get_analyzer_cache().get(key, file_path, backend)
+
+def _load_analyzer(file_path, backend):
+    """Load and initialize the iScale analyzer with data on the chosen execution backend"""
+    try:
+        analyzer = iScaleDataAnalyzer(file_path, backend=CachedBackend(get_backend(backend), get_query_cache()))
         if analyzer.load_and_process_data():
             return analyzer
         else:
@@ -111,14 +170,15 @@ def main():
     
     # Navigation
     st.markdown("### Choose Your Analysis View:")
-    col1, col2, col3, col4, col5 = st.columns(5)
+    col1, col2, col3, col4, col5, col6 = st.columns(6)
     
     views = [
         "Overview", 
         "3D/7D Conversions", 
         "Hourly Performance",
         "Coach Insights",
-        "Key Recommendations"
+        "Key Recommendations",
+        "Live Monitor"
     ]
     
     # Session state for current view
@@ -145,21 +205,75 @@ def main():
         if st.button(views[4], key="btn5"):
             st.session_state.current_view = views[4]
     
-    st.markdown("---")
+    with col6:
+        if st.button(views[5], key="btn6"):
+            st.session_state.current_view = views[5]
     
-    # Load pre-computed analysis results first
-    analysis_results = load_analysis_results()
-    
-    # Load data using the analyzer (for charts and detailed analysis)
-    with st.spinner("Loading and processing consultation data..."):
-        analyzer = load_analyzer()
-    
-    if analyzer is None:
-        st.error("Failed to load data. Please check the file path and try again.")
+    st.markdown("---")
+
+    # The live view reads the event stream, not the snapshot datasets
+    if st.session_state.current_view == "Live Monitor":
+        display_live_monitor()
+        return
+
+    # Execution backend (pandas in memory, or an embedded engine over the file)
+    backend_names = list(BACKENDS)
+    backend = st.sidebar.selectbox(
+        "Execution Backend", backend_names,
+        index=backend_names.index(DEFAULT_BACKEND) if DEFAULT_BACKEND in backend_names else 0
+    )
+
+    # Datasets to show; picking more than one switches every view to comparison mode
+    datasets = discover_datasets()
+    if not datasets:
+        st.error("No datasets found. Set ISCALE_DATASETS or ISCALE_DATA_DIR.")
         return
+    selected = st.sidebar.multiselect("Datasets", list(datasets), default=list(datasets)[:1])
+    if not selected:
+        st.info("Select at least one dataset in the sidebar.")
+        return
+
+    # Load data using the analyzer (for charts and detailed analysis)
+    analyzers = {}
+    for name in selected:
+        with st.spinner(f"Loading and processing {name}..."):
+            analyzers[name] = load_analyzer(datasets[name], backend)
+        if analyzers[name] is None:
+            st.error(f"Failed to load {name}. Please check the file path and try again.")
+            return
+
+    filters = select_filters(analyzers)
+    if filters:
+        for name in list(analyzers):
+            analyzers[name] = analyzers[name].subset(**filters)
+            if analyzers[name].backend.row_count() == 0:
+                st.warning(f"No consultations in {name} match the selected filters.")
+                del analyzers[name]
+        if not analyzers:
+            return
+
+    cache_stats = get_analyzer_cache().stats()
+    st.sidebar.caption(
+        f"Dataset cache: {cache_stats['entries']} loaded, "
+        f"{cache_stats['total_bytes'] / 1024 ** 2:,.0f} / {cache_stats['max_bytes'] / 1024 ** 2:,.0f} MB"
+    )
+    query_stats = get_query_cache().stats()
+    st.sidebar.caption(
+        f"Query cache: {query_stats['entries']} results, "
+        f"{query_stats['total_bytes'] / 1024 ** 2:,.1f} / {query_stats['max_bytes'] / 1024 ** 2:,.0f} MB, "
+        f"{query_stats['hits']} hits, {query_stats['derived']} rolled up, {query_stats['misses']} misses"
+    )
     
     # Get current view
     analysis_type = st.session_state.current_view
+
+    if len(analyzers) > 1:
+        display_comparison(analysis_type, analyzers)
+        return
+
+    name, analyzer = next(iter(analyzers.items()))
+    # Pre-computed results only describe the unfiltered default extract
+    analysis_results = load_analysis_results() if datasets[name] == CSV_FILE_PATH and not filters else None
     
     # Display content based on selected view
     if analysis_type == "Overview":
@@ -173,6 +287,83 @@ def main():
     elif analysis_type == "Key Recommendations":
         display_key_insights(analyzer, analysis_results)
 
+@st.cache_resource
+def get_live_backend():
+    """Process-wide live state fed from ISCALE_EVENT_LOG and/or ISCALE_EVENT_PORT"""
+    if not EVENT_LOG and not EVENT_PORT:
+        return None
+    live = LiveBackend()
+    if EVENT_LOG:
+        if not os.path.exists(EVENT_LOG):
+            open(EVENT_LOG, 'a').close()
+        live.load(EVENT_LOG)
+        live.follow()
+    if EVENT_PORT:
+        live.serve(EVENT_HOST, int(EVENT_PORT))
+    return live
+
+def display_live_monitor():
+    """Today's KPIs from the booking event stream, refreshed in place"""
+    st.header("Live Monitor")
+    live = get_live_backend()
+    if live is None:
+        st.info("Set ISCALE_EVENT_LOG to an NDJSON event log (or ISCALE_EVENT_PORT to a TCP port) to watch live events. "
+                "`python iScale_Live.py replay iScale_MaskedData.csv events.ndjson --delay 0.01` simulates a feed.")
+        return
+    live_panel(live)
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def live_panel(live):
+    """KPIs and charts over one consistent snapshot of the live state"""
+    stats = live.stats()
+    st.caption(f"{stats['events']:,} events ({stats['rejected']:,} rejected, {stats['pending']:,} awaiting their consultation), "
+               f"refreshing every {LIVE_REFRESH_SECONDS:g}s")
+    snapshot = live.snapshot()
+    if snapshot.row_count() == 0:
+        st.info("Waiting for consultation events...")
+        return
+    analyzer = iScaleDataAnalyzer(live.source, backend=snapshot)
+    insights = analyzer.get_key_insights()
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Consultations", f"{insights['total_consultations']:,}")
+    with col2:
+        st.metric("Conversions", f"{insights['total_conversions']:,}")
+    with col3:
+        st.metric("Conversion Rate", f"{insights['overall_conversion_rate']:.1f}%")
+    with col4:
+        st.metric("User Conversion Rate", f"{insights['user_conversion_rate']:.1f}%")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        hourly_stats = analyzer.analyze_hourly_performance()
+        if len(hourly_stats) > 0:
+            st.plotly_chart(charts.hourly_performance_chart(hourly_stats), use_container_width=True)
+    with col2:
+        funnel_performance = analyzer.analyze_funnel_performance()
+        if len(funnel_performance) > 0:
+            st.plotly_chart(charts.funnel_conversion_chart(funnel_performance), use_container_width=True)
+
+    conversion_summary = charts.chart_inputs(analyzer, 'conversion_rates_analysis')['conversion_summary']
+    st.subheader("3-Day & 7-Day Conversion by Segment")
+    st.dataframe(conversion_summary[['funnel', 'lead_type', 'user_id', 'conversion_flag',
+                                     'conversion_rate_3d', 'conversion_rate_7d']], use_container_width=True)
+    display_data_quality(analyzer)
+
+def select_filters(analyzers):
+    """Sidebar filters over the selected datasets; empty selections mean all values"""
+    st.sidebar.markdown("### Filters")
+    filters = {}
+    for column, label in FILTER_COLUMNS.items():
+        values = set()
+        for analyzer in analyzers.values():
+            values.update(analyzer.analyze_distribution(column)[column].astype(object).tolist())
+        chosen = st.sidebar.multiselect(label, sorted(values, key=str), key=f"filter_{column}")
+        if chosen:
+            filters[column] = chosen
+    return filters
+
 def display_overview(analyzer, analysis_results=None):
     """Display overview metrics and distributions"""
     st.header("Business Overview")
@@ -257,16 +448,32 @@ def display_overview(analyzer, analysis_results=None):
     col1, col2 = st.columns(2)
     
     with col1:
-        funnel_counts = analyzer.df['funnel'].value_counts()
-        fig = px.pie(values=funnel_counts.values, names=funnel_counts.index, 
-                    title="Distribution by Funnel")
+        fig = charts.funnel_distribution_chart(analyzer.analyze_distribution('funnel'))
         st.plotly_chart(fig, use_container_width=True)
     
     with col2:
-        lead_counts = analyzer.df['lead_type'].value_counts()
-        fig = px.pie(values=lead_counts.values, names=lead_counts.index,
-                    title="Distribution by Lead Type")
+        fig = charts.lead_type_distribution_chart(analyzer.analyze_distribution('lead_type'))
         st.plotly_chart(fig, use_container_width=True)
+    
+    display_data_quality(analyzer)
+
+def display_data_quality(analyzer):
+    """Display the ingestion quality report for the loaded extract"""
+    quality = analyzer.get_data_quality()
+    if not quality:
+        return
+    issues = quality_issues(quality)
+    with st.expander(f"Data Quality ({len(issues)} issue{'s' if len(issues) != 1 else ''})", expanded=bool(issues)):
+        for issue in issues:
+            st.warning(issue)
+        if not issues:
+            st.success(f"No quality issues found in {quality['rows']:,} rows")
+        st.dataframe(
+            {'column': list(quality['null_counts']),
+             'nulls': list(quality['null_counts'].values()),
+             'coerced_to_null': [quality['coerced_to_null'].get(col, 0) for col in quality['null_counts']]},
+            use_container_width=True
+        )
 
 def display_conversion_analysis(analyzer, analysis_results=None):
     """Display 3-day and 7-day conversion analysis"""
@@ -303,25 +510,28 @@ def display_conversion_analysis(analyzer, analysis_results=None):
         st.dataframe(conversion_summary[['funnel', 'lead_type', 'user_id', 'conversion_flag', 
                                        'conversion_rate_3d', 'conversion_rate_7d']], 
                     use_container_width=True)
-        fig = make_subplots(
-            rows=1, cols=2,
-            subplot_titles=('3-Day Conversion Rate', '7-Day Conversion Rate')
-        )
-        conversion_summary['segment_label'] = conversion_summary['funnel'] + ' - ' + conversion_summary['lead_type']
-        fig.add_trace(
-            go.Bar(x=conversion_summary['segment_label'], y=conversion_summary['conversion_rate_3d'],
-                  name='3-Day Rate', marker_color='lightblue'),
-            row=1, col=1
-        )
-        fig.add_trace(
-            go.Bar(x=conversion_summary['segment_label'], y=conversion_summary['conversion_rate_7d'],
-                  name='7-Day Rate', marker_color='lightgreen'),
-            row=1, col=2
-        )
-        fig.update_layout(height=500, title="Conversion Rates Comparison", showlegend=False)
-        fig.update_xaxes(tickangle=45)
+        fig = charts.conversion_rates_chart(conversion_summary)
         st.plotly_chart(fig, use_container_width=True)
 
+    journeys = analyzer.analyze_user_journeys()
+
+    if journeys is not None:
+        st.subheader("User-Level Conversion (Repeat Consultations Consolidated)")
+        user_summary = journeys['summary']
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Unique Users", f"{user_summary['total_users']:,}")
+        with col2:
+            st.metric("User Conversion Rate", f"{user_summary['user_conversion_rate']:.1f}%")
+        with col3:
+            st.metric("Consultations per Conversion", f"{user_summary['avg_consultations_to_conversion']:.2f}")
+
+        attribution = journeys['first_touch'].merge(
+            journeys['last_touch'][['funnel', 'lead_type', 'user_conversion_rate']],
+            on=['funnel', 'lead_type'], how='outer', suffixes=('_first_touch', '_last_touch')
+        )
+        st.dataframe(attribution, use_container_width=True)
+
 def display_hourly_analysis(analyzer, analysis_results=None):
     """Display hourly performance analysis"""
     st.header("Hourly Performance Analysis")
@@ -361,29 +571,7 @@ def display_hourly_analysis(analyzer, analysis_results=None):
     hourly_stats = analyzer.analyze_hourly_performance()
     
     if hourly_stats is not None:
-        fig = make_subplots(
-            rows=2, cols=1,
-            subplot_titles=('Connectivity Rate by Hour', 'Conversion Rate by Hour'),
-            vertical_spacing=0.1
-        )
-        
-        fig.add_trace(
-            go.Scatter(x=hourly_stats['slot_hour'], y=hourly_stats['connectivity_rate'],
-                      mode='lines+markers', name='Connectivity Rate', line=dict(color='blue')),
-            row=1, col=1
-        )
-        
-        fig.add_trace(
-            go.Scatter(x=hourly_stats['slot_hour'], y=hourly_stats['conversion_rate'],
-                      mode='lines+markers', name='Conversion Rate', line=dict(color='green')),
-            row=2, col=1
-        )
-        
-        fig.update_xaxes(title_text="Hour of Day", row=2, col=1)
-        fig.update_yaxes(title_text="Connectivity Rate (%)", row=1, col=1)
-        fig.update_yaxes(title_text="Conversion Rate (%)", row=2, col=1)
-        fig.update_layout(height=600, title="Performance by Time of Day")
-        
+        fig = charts.hourly_performance_chart(hourly_stats)
         st.plotly_chart(fig, use_container_width=True)
         
         best_connectivity_hour = hourly_stats.loc[hourly_stats['connectivity_rate'].idxmax(), 'slot_hour']
@@ -413,30 +601,27 @@ def display_coach_analysis(analyzer, analysis_results=None):
         </div>
         """, unsafe_allow_html=True)
     
-    funnel_performance = analyzer.df.groupby('funnel').agg({
-        'user_id': 'count',
-        'conversion_flag': 'sum'
-    }).reset_index()
-    funnel_performance['conversion_rate'] = (funnel_performance['conversion_flag'] / funnel_performance['user_id'] * 100).round(2)
+    funnel_performance = analyzer.analyze_funnel_performance()
     
     col1, col2 = st.columns(2)
     
     with col1:
-        fig = px.bar(funnel_performance, x='funnel', y='conversion_rate',
-                    title="Conversion Rate by Funnel", color='conversion_rate')
+        fig = charts.funnel_conversion_chart(funnel_performance)
         st.plotly_chart(fig, use_container_width=True)
     
     with col2:
-        fig = px.bar(funnel_performance, x='funnel', y='user_id',
-                    title="Consultation Volume by Funnel", color='user_id')
+        fig = charts.funnel_volume_chart(funnel_performance)
         st.plotly_chart(fig, use_container_width=True)
+    
+    class_stats = analyzer.analyze_class_performance()
+    if class_stats is not None:
+        st.plotly_chart(charts.class_performance_chart(class_stats), use_container_width=True)
 
 def display_key_insights(analyzer, analysis_results=None):
     """Display key business insights and recommendations"""
     st.header("Abeer's Strategic Business Insights")
     
     if analysis_results:
-        data_summary = analysis_results.get('data_summary', {})
         key_findings = analysis_results.get('key_findings', {})
         segment_perf = analysis_results.get('segment_performance', {})
         
@@ -452,18 +637,6 @@ def display_key_insights(analyzer, analysis_results=None):
             st.write(f"• **Best 7-day Segment**: {segment_perf['best_7d_segment']} ({segment_perf['best_7d_rate']:.1f}%)")
         st.markdown('</div>', unsafe_allow_html=True)
         
-        if 'overall_conversion_rate' in data_summary:
-            current_rate = data_summary['overall_conversion_rate']
-            potential_rate = current_rate * 1.2  
-            additional_conversions = data_summary['total_consultations'] * (potential_rate - current_rate) / 100
-            
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("Current Rate", f"{current_rate:.1f}%")
-            with col2:
-                st.metric("Potential Rate", f"{potential_rate:.1f}%", f"+{potential_rate - current_rate:.1f}%")
-            with col3:
-                st.metric("Additional Conversions", f"+{int(additional_conversions):,}")
     else:
         insights = analyzer.get_key_insights()
         
@@ -477,18 +650,6 @@ def display_key_insights(analyzer, analysis_results=None):
             if 'best_conversion_hour' in insights:
                 st.write(f"• **Peak Conversion**: {insights['best_conversion_hour']:02d}:00 ({insights['best_conversion_rate']:.1f}%)")
             st.markdown('</div>', unsafe_allow_html=True)
-            
-            current_rate = insights['overall_conversion_rate']
-            potential_rate = current_rate * 1.2  # 20% improvement
-            additional_conversions = insights['total_consultations'] * (potential_rate - current_rate) / 100
-            
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("Current Rate", f"{current_rate:.1f}%")
-            with col2:
-                st.metric("Potential Rate", f"{potential_rate:.1f}%", f"+{potential_rate - current_rate:.1f}%")
-            with col3:
-                st.metric("Additional Conversions", f"+{int(additional_conversions):,}")
     
     st.markdown('<div class="insight-box">', unsafe_allow_html=True)
     st.markdown("### **Strategic Recommendations**")
@@ -498,5 +659,218 @@ def display_key_insights(analyzer, analysis_results=None):
     st.write("4. **Train coaches based on top performer best practices**")
     st.markdown('</div>', unsafe_allow_html=True)
 
+    display_policy_simulator(analyzer)
+
+@st.cache_resource
+def _fit_simulator(_analyzer, version, filters):
+    """Fit the slot policy simulator once per dataset version and filter selection"""
+    return SlotPolicySimulator.from_analyzer(_analyzer, seed=42)
+
+def load_simulator(analyzer):
+    """Shared simulator for an analyzer; each simulation seeds its own generator, so reruns repeat"""
+    return _fit_simulator(analyzer, analyzer.backend.version, normalize_filters(analyzer.filters))
+
+def display_policy_simulator(analyzer):
+    """Interactive what-if for peak-hour slot scheduling policies"""
+    st.subheader("Slot Scheduling What-If Simulator")
+    simulator = load_simulator(analyzer)
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        peak_share = st.slider("Share of slots in peak hours", 0, 100, 70, step=5) / 100
+    with col2:
+        n_peak_hours = st.slider("Peak hours per segment", 1, 8, 3)
+    with col3:
+        draws = st.select_slider("Simulation draws", options=[200, 500, 1000, 2000], value=500)
+
+    summary, uplift = simulator.compare_peak_share(peak_share, n_peak_hours, draws=draws)
+    current, proposed = summary.iloc[0], summary.iloc[1]
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Current Rate", f"{current['conversion_rate_mean']:.1f}%")
+    with col2:
+        st.metric("Simulated Rate", f"{proposed['conversion_rate_mean']:.1f}%",
+                  f"{proposed['conversion_rate_mean'] - current['conversion_rate_mean']:+.1f}%")
+    with col3:
+        st.metric("Additional Conversions", f"{uplift['uplift_mean']:+,.0f}",
+                  f"90% range {uplift['uplift_p5']:+,.0f} to {uplift['uplift_p95']:+,.0f}", delta_color="off")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        fig = charts.peak_uplift_chart(uplift['uplift_draws'], uplift['probability_better'])
+        st.plotly_chart(fig, use_container_width=True)
+
+    with col2:
+        fig = charts.peak_share_sweep_chart(charts.peak_share_sweep(simulator, n_peak_hours, draws))
+        st.plotly_chart(fig, use_container_width=True)
+
+def combine_datasets(analyzers, build):
+    """Stack one frame per dataset with a dataset column"""
+    frames = []
+    for name, analyzer in analyzers.items():
+        frame = build(analyzer)
+        if frame is not None:
+            frames.append(frame.assign(dataset=name))
+    return pd.concat(frames, ignore_index=True) if frames else None
+
+def display_comparison(analysis_type, analyzers):
+    """Side-by-side version of the selected view across datasets"""
+    st.caption(f"Comparing {len(analyzers)} datasets: {', '.join(analyzers)}")
+    if analysis_type == "Overview":
+        compare_overview(analyzers)
+    elif analysis_type == "3D/7D Conversions":
+        compare_conversion_analysis(analyzers)
+    elif analysis_type == "Hourly Performance":
+        compare_hourly_analysis(analyzers)
+    elif analysis_type == "Coach Insights":
+        compare_coach_analysis(analyzers)
+    elif analysis_type == "Key Recommendations":
+        compare_key_insights(analyzers)
+
+def compare_overview(analyzers):
+    """Headline metrics and mix per dataset"""
+    st.header("Business Overview")
+    insights = {name: analyzer.get_key_insights() for name, analyzer in analyzers.items()}
+    metrics = pd.DataFrame({
+        name: {
+            'Total Consultations': i['total_consultations'],
+            'Total Conversions': i['total_conversions'],
+            'Conversion Rate (%)': round(i['overall_conversion_rate'], 1),
+            'Active Coaches': i['active_coaches'],
+            'Unique Users': i['total_users'],
+            'User Conversion Rate (%)': round(i['user_conversion_rate'], 1),
+        }
+        for name, i in insights.items()
+    })
+    st.dataframe(metrics, use_container_width=True)
+
+    st.markdown("---")
+    col1, col2 = st.columns(2)
+    for col, column, title in [(col1, 'funnel', "Funnel Mix"), (col2, 'lead_type', "Lead Type Mix")]:
+        mix = combine_datasets(analyzers, lambda a: a.analyze_distribution(column))
+        mix[column] = mix[column].astype(str)
+        # Shares, not counts, so datasets of different size line up
+        mix['share'] = mix['user_id'] / mix.groupby('dataset')['user_id'].transform('sum') * 100
+        with col:
+            fig = px.bar(mix, x=column, y='share', color='dataset', barmode='group',
+                         title=f"{title} (% of consultations)")
+            st.plotly_chart(fig, use_container_width=True)
+
+    for name, analyzer in analyzers.items():
+        issues = quality_issues(analyzer.get_data_quality())
+        if issues:
+            st.warning(f"{name}: " + '; '.join(issues))
+
+def compare_conversion_analysis(analyzers):
+    """3-day and 7-day conversion by segment per dataset"""
+    st.header("3-Day & 7-Day Conversion Analysis")
+
+    def segment_rates(analyzer):
+        conv_3d = analyzer.calculate_conversion_rates(3)
+        conv_7d = analyzer.calculate_conversion_rates(7)
+        return conv_3d.merge(conv_7d[['funnel', 'lead_type', 'conversion_rate_7d']], on=['funnel', 'lead_type'])
+
+    conversion_summary = combine_datasets(analyzers, segment_rates)
+    conversion_summary['segment_label'] = conversion_summary['funnel'] + ' - ' + conversion_summary['lead_type'].astype(str)
+    rates = conversion_summary.melt(
+        id_vars=['dataset', 'segment_label'], value_vars=['conversion_rate_3d', 'conversion_rate_7d'],
+        var_name='window', value_name='conversion_rate'
+    )
+    rates['window'] = rates['window'].map({'conversion_rate_3d': '3-Day Rate', 'conversion_rate_7d': '7-Day Rate'})
+    fig = px.bar(rates, x='segment_label', y='conversion_rate', color='dataset', barmode='group',
+                 facet_row='window', title="Conversion Rates Comparison")
+    fig.update_layout(height=700)
+    fig.update_xaxes(tickangle=45)
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(conversion_summary[['dataset', 'funnel', 'lead_type', 'user_id', 'conversion_flag',
+                                     'conversion_rate_3d', 'conversion_rate_7d']],
+                 use_container_width=True)
+
+    st.subheader("User-Level Conversion (Repeat Consultations Consolidated)")
+    user_summary = pd.DataFrame({
+        name: {
+            'Unique Users': journeys['summary']['total_users'],
+            'User Conversion Rate (%)': round(journeys['summary']['user_conversion_rate'], 1),
+            'Consultations per Conversion': round(journeys['summary']['avg_consultations_to_conversion'], 2),
+        }
+        for name, journeys in ((name, a.analyze_user_journeys()) for name, a in analyzers.items())
+    })
+    st.dataframe(user_summary, use_container_width=True)
+
+def compare_hourly_analysis(analyzers):
+    """Hourly connectivity and conversion curves per dataset"""
+    st.header("Hourly Performance Analysis")
+    hourly_stats = combine_datasets(analyzers, lambda a: a.analyze_hourly_performance())
+    curves = hourly_stats.melt(
+        id_vars=['dataset', 'slot_hour'], value_vars=['connectivity_rate', 'conversion_rate'],
+        var_name='metric', value_name='rate'
+    )
+    curves['metric'] = curves['metric'].map({'connectivity_rate': 'Connectivity Rate (%)',
+                                             'conversion_rate': 'Conversion Rate (%)'})
+    fig = px.line(curves, x='slot_hour', y='rate', color='dataset', facet_row='metric', markers=True,
+                  title="Performance by Time of Day")
+    fig.update_yaxes(matches=None)
+    fig.update_xaxes(title_text="Hour of Day")
+    fig.update_layout(height=600)
+    st.plotly_chart(fig, use_container_width=True)
+
+    best = hourly_stats.groupby('dataset', sort=False).apply(lambda h: pd.Series({
+        'Best Connectivity': f"{h.loc[h['connectivity_rate'].idxmax(), 'slot_hour']}:00",
+        'Best Conversion': f"{h.loc[h['conversion_rate'].idxmax(), 'slot_hour']}:00",
+        'Average Performance (%)': round((h['connectivity_rate'].mean() + h['conversion_rate'].mean()) / 2, 1),
+    }))
+    st.dataframe(best, use_container_width=True)
+
+def compare_coach_analysis(analyzers):
+    """Funnel and coach class performance per dataset"""
+    st.header("Coach & Funnel Performance")
+    funnel_performance = combine_datasets(analyzers, lambda a: a.analyze_funnel_performance())
+    col1, col2 = st.columns(2)
+    with col1:
+        fig = px.bar(funnel_performance, x='funnel', y='conversion_rate', color='dataset', barmode='group',
+                     title="Conversion Rate by Funnel")
+        st.plotly_chart(fig, use_container_width=True)
+    with col2:
+        fig = px.bar(funnel_performance, x='funnel', y='user_id', color='dataset', barmode='group',
+                     title="Consultation Volume by Funnel")
+        st.plotly_chart(fig, use_container_width=True)
+
+    class_stats = combine_datasets(analyzers, lambda a: a.analyze_class_performance())
+    class_stats['target_class'] = class_stats['target_class'].astype(str)
+    col1, col2 = st.columns(2)
+    with col1:
+        fig = px.bar(class_stats, x='target_class', y='conversion_rate', color='dataset', barmode='group',
+                     title="Conversion Rate by Coach Class")
+        st.plotly_chart(fig, use_container_width=True)
+    with col2:
+        fig = px.bar(class_stats, x='target_class', y='connectivity_rate', color='dataset', barmode='group',
+                     title="Connectivity Rate by Coach Class")
+        st.plotly_chart(fig, use_container_width=True)
+
+def compare_key_insights(analyzers):
+    """Key findings and simulated peak-hour uplift per dataset"""
+    st.header("Abeer's Strategic Business Insights")
+    findings, uplifts = {}, []
+    for name, analyzer in analyzers.items():
+        insights = analyzer.get_key_insights()
+        findings[name] = {
+            'Best Funnel': f"{insights['best_funnel']} ({insights['best_funnel_rate']:.1f}%)",
+            'Peak Connectivity': f"{insights['best_connectivity_hour']:02d}:00 ({insights['best_connectivity_rate']:.1f}%)",
+            'Peak Conversion': f"{insights['best_conversion_hour']:02d}:00 ({insights['best_conversion_rate']:.1f}%)",
+            'Best 7-day Segment': f"{insights['best_7d_segment']} ({insights['best_7d_rate']:.1f}%)",
+        }
+        simulator = load_simulator(analyzer)
+        _, uplift = simulator.compare_peak_share(0.7, draws=500)
+        uplifts.append({'dataset': name, 'uplift': uplift['uplift_mean'],
+                        'low': uplift['uplift_mean'] - uplift['uplift_p5'],
+                        'high': uplift['uplift_p95'] - uplift['uplift_mean']})
+    st.dataframe(pd.DataFrame(findings), use_container_width=True)
+
+    uplifts = pd.DataFrame(uplifts)
+    fig = px.bar(uplifts, x='dataset', y='uplift', error_y='high', error_y_minus='low',
+                 title="Additional Conversions from 70% Peak-Hour Scheduling (90% range)")
+    st.plotly_chart(fig, use_container_width=True)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,64 @@
+import importlib.util
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# duckdb is an optional dependency; its backend is only compared when installed
+ENGINES = ('pandas', 'duckdb') if importlib.util.find_spec('duckdb') else ('pandas',)
+
+
+def synthetic_consultations(n=6000, seed=0, days=30, conversion_rate=0.06, class_effect=0.0, dirty=False):
+    """Raw consultation rows shaped like the masked extract.
+
+    Outcomes are independent of hour, class and funnel unless
+    ``class_effect`` is added to class A's conversion rate. ``dirty`` mixes
+    in what the real extracts contain: unparseable and missing slots,
+    unknown and missing medical flags, missing funnels, users and booking
+    flags, and consultations booked twice.
+    """
+    rng = np.random.default_rng(seed)
+    slot = pd.Timestamp('2025-06-01') + pd.to_timedelta(rng.integers(0, days * 24 * 60, n), unit='m')
+    target_class = rng.choice(['A', 'B', 'C', 'D'], n)
+    paid = rng.random(n) < conversion_rate + class_effect * (target_class == 'A')
+    payment = slot + pd.to_timedelta(rng.integers(-2 * 24 * 60, 20 * 24 * 60, n), unit='m')
+    df = pd.DataFrame({
+        'user_id': rng.integers(0, n // 2, n),
+        'expert_id': rng.integers(1, 41, n),
+        'target_class': target_class,
+        'funnel': rng.choice(['Bot', 'Web', 'App', 'Referral'], n),
+        'India vs NRI': rng.choice(['India', 'NRI'], n),
+        'medicalconditionflag': rng.choice(['Yes', 'No'], n),
+        'booked_flag': rng.choice(['Booked', 'Not Booked'], n),
+        'current_status': rng.choice(['Done', 'Missed', 'Cancelled'], n),
+        'handled_time': (slot - pd.to_timedelta(rng.integers(0, 3 * 24 * 60, n), unit='m')).astype(str),
+        'slot_start_time': slot.astype(str),
+        'payment_time': np.where(paid, payment.astype(str), ''),
+    })
+    if dirty:
+        def some(share):
+            return rng.random(n) < share
+        df = df.astype({'user_id': 'float64'})
+        df.loc[some(0.01), 'slot_start_time'] = 'garbage'
+        df.loc[some(0.005), 'slot_start_time'] = ''
+        df.loc[some(0.01), 'medicalconditionflag'] = 'Maybe'
+        df.loc[some(0.005), 'medicalconditionflag'] = ''
+        df.loc[some(0.01), 'funnel'] = ''
+        df.loc[some(0.01), 'booked_flag'] = ''
+        df.loc[some(0.005), 'India vs NRI'] = ''
+        df.loc[some(0.005), 'user_id'] = np.nan
+        df = pd.concat([df, df.sample(10, random_state=seed)], ignore_index=True)
+    return df
+
+
+@pytest.fixture
+def write_csv(tmp_path):
+    def write(df, name='consultations.csv'):
+        path = tmp_path / name
+        df.to_csv(path, index=False)
+        return str(path)
+    return write
@@ -0,0 +1,85 @@
+import pytest
+
+import iScale_Parallel
+from iScale_Analysis_clean import iScaleAnalyzer
+from iScale_Backend import BACKENDS, MEASURES, PandasBackend, _compare, verify_backend_parity
+from iScale_DA import iScaleDataAnalyzer
+from conftest import ENGINES, synthetic_consultations
+
+KEY_SETS = [
+    ['funnel'],
+    ['slot_hour'],
+    ['funnel', 'lead_type'],
+    ['expert_id', 'lead_type'],
+    ['target_class', 'slot_hour', 'slot_month'],
+    ['funnel', 'lead_type', 'target_class', 'expert_id', 'slot_hour', 'slot_month'],
+]
+
+
+@pytest.fixture(scope='module')
+def dirty_csv(tmp_path_factory):
+    path = tmp_path_factory.mktemp('backends') / 'dirty.csv'
+    synthetic_consultations(8000, seed=11, dirty=True).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture(scope='module')
+def pandas_backend(dirty_csv):
+    backend = PandasBackend()
+    backend.load(dirty_csv)
+    return backend
+
+
+def test_fixture_is_dirty(pandas_backend):
+    quality = pandas_backend.quality
+    assert quality['coerced_to_null']['slot_start_time'] > 0
+    assert quality['null_counts']['funnel'] > 0
+    assert quality['null_counts']['user_id'] > 0
+    assert quality['unknown_values']['medicalconditionflag'].get('Maybe', 0) > 0
+    assert quality['negative_conversion_lags'] > 0
+    assert quality['duplicate_consultations'] >= 10
+
+
+@pytest.mark.parametrize('analyzer_cls', [iScaleDataAnalyzer, iScaleAnalyzer], ids=lambda cls: cls.__name__)
+def test_backends_agree(dirty_csv, analyzer_cls, monkeypatch):
+    # Several partitions and shards, so the parallel merge is exercised
+    monkeypatch.setattr(iScale_Parallel, 'MIN_PARTITION_BYTES', 1 << 16)
+    monkeypatch.setitem(BACKENDS, 'parallel', lambda: iScale_Parallel.ParallelBackend(workers=2, partitions=4, shards=3))
+    assert verify_backend_parity(analyzer_cls, dirty_csv, backends=ENGINES + ('parallel',)) == []
+
+
+@pytest.mark.parametrize('keys', KEY_SETS, ids='+'.join)
+def test_bincount_matches_groupby(pandas_backend, keys):
+    measures = list(MEASURES)
+    dense = pandas_backend.aggregate(keys, measures, within_days=7)
+    assert tuple(keys) in pandas_backend._cells_cache
+    mismatches = []
+    _compare(pandas_backend._groupby_aggregate(keys, measures, 7), dense, '+'.join(keys), mismatches)
+    assert mismatches == []
+
+
+def test_subsets_agree_across_backends(dirty_csv):
+    analyzers = {}
+    for backend in ENGINES + ('parallel',):
+        analyzers[backend] = iScaleDataAnalyzer(dirty_csv, backend=backend)
+        assert analyzers[backend].load_and_process_data()
+    for filters in ({'funnel': 'Bot'}, {'target_class': ['A', 'B'], 'slot_month': '2025-06'}):
+        results = {backend: analyzer.subset(**filters).get_key_insights() for backend, analyzer in analyzers.items()}
+        mismatches = []
+        for backend in ENGINES[1:] + ('parallel',):
+            _compare(results['pandas'], results[backend], backend, mismatches)
+        assert mismatches == []
+
+
+
+@pytest.mark.skipif('duckdb' not in ENGINES, reason="duckdb is not installed")
+def test_duckdb_subsets_leave_no_views(dirty_csv, pandas_backend):
+    from iScale_Backend import DuckDBBackend
+
+    backend = DuckDBBackend()
+    backend.load(dirty_csv)
+    views = backend.con.execute("SELECT COUNT(*) FROM duckdb_views() WHERE NOT internal").fetchone()[0]
+    nested = backend.subset({'funnel': ['Bot', 'Web']}).subset({'target_class': 'A'})
+    expected = pandas_backend.subset({'funnel': ['Bot', 'Web']}).subset({'target_class': 'A'})
+    assert nested.row_count() == expected.row_count()
+    assert backend.con.execute("SELECT COUNT(*) FROM duckdb_views() WHERE NOT internal").fetchone()[0] == views
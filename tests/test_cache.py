@@ -0,0 +1,159 @@
+import threading
+
+import numpy as np
+import pytest
+
+from iScale_Backend import PandasBackend, _compare, get_backend
+from iScale_Cache import AnalyzerCache, CachedBackend, QueryCache, normalize_filters
+from conftest import ENGINES, synthetic_consultations
+
+MEASURES = ['consultations', 'conversions', 'connected', 'conversions_within']
+FILTER_VALUES = {
+    'funnel': ['Bot', 'Web', 'App', 'Referral'],
+    'lead_type': ['India_Medical', 'India_NonMedical', 'NRI_Medical', 'NRI_NonMedical'],
+    'target_class': ['A', 'B', 'C', 'D'],
+    'slot_month': ['2025-06', '2025-07'],
+}
+KEY_SETS = [['funnel'], ['lead_type'], ['slot_hour'], ['funnel', 'lead_type'], ['target_class', 'slot_hour']]
+
+
+@pytest.fixture(scope='module')
+def dirty_csv(tmp_path_factory):
+    path = tmp_path_factory.mktemp('cache') / 'dirty.csv'
+    synthetic_consultations(6000, seed=13, days=45, dirty=True).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize('backend_name', ENGINES)
+def test_rolled_up_aggregates_are_exact(dirty_csv, backend_name):
+    direct = get_backend(backend_name)
+    direct.load(dirty_csv)
+    cache = QueryCache(64 * 1024 ** 2)
+    cached = CachedBackend(get_backend(backend_name), cache)
+    cached.load(dirty_csv)
+
+    rng = np.random.default_rng(0)
+    mismatches = []
+    for _ in range(25):
+        columns = rng.choice(list(FILTER_VALUES), size=rng.integers(0, 3), replace=False)
+        filters = {column: list(rng.choice(FILTER_VALUES[column], size=rng.integers(1, 3), replace=False))
+                   for column in columns}
+        keys = KEY_SETS[rng.integers(len(KEY_SETS))]
+        expected = (direct.subset(filters) if filters else direct).aggregate(keys, MEASURES, within_days=7)
+        actual = cached.subset(filters).aggregate(keys, MEASURES, within_days=7)
+        _compare(expected, actual, f"{keys} {normalize_filters(filters)}", mismatches)
+    assert mismatches == []
+    assert cache.derived > 0
+
+
+def test_nulls_in_a_dropped_key_block_the_roll_up(dirty_csv):
+    backend = PandasBackend()
+    backend.load(dirty_csv)
+    cache = QueryCache(64 * 1024 ** 2)
+    cached = CachedBackend(backend, cache, version='v')
+    # Rows with a null funnel are missing from this aggregate...
+    cached.aggregate(['funnel', 'lead_type'], MEASURES, within_days=7)
+    # ...so summing it over funnel would undercount every lead type
+    rolled = cached.aggregate(['lead_type'], MEASURES, within_days=7)
+    mismatches = []
+    _compare(backend.aggregate(['lead_type'], MEASURES, within_days=7), rolled, 'lead_type', mismatches)
+    assert mismatches == []
+    assert cache.derived == 0
+
+
+def test_filtered_quality_does_not_materialize_the_subset(dirty_csv, monkeypatch):
+    backend = PandasBackend()
+    backend.load(dirty_csv)
+    cached = CachedBackend(backend, QueryCache(64 * 1024 ** 2), version='v')
+    monkeypatch.setattr(backend, 'subset', lambda filters: pytest.fail("subset was materialized"))
+    assert cached.quality['rows'] == backend.row_count()
+    assert cached.subset({'funnel': 'Bot'}).quality is None
+
+
+class _Loaded:
+    """Stand-in analyzer whose measured size can change after loading."""
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+
+def _analyzer_cache(max_bytes, loads=None):
+    def load(name, size=10):
+        if loads is not None:
+            loads.append(name)
+        return _Loaded(name, size)
+    return AnalyzerCache(load, max_bytes, sizeof=lambda analyzer: analyzer.size)
+
+
+def test_analyzer_cache_evicts_least_recently_used():
+    cache = _analyzer_cache(25)
+    cache.get('may', 'may')
+    cache.get('june', 'june')
+    cache.get('may', 'may')
+    cache.get('july', 'july')
+    assert list(cache.entries) == ['may', 'july']
+    assert cache.stats()['evictions'] == 1 and cache.total_bytes <= 25
+
+
+def test_analyzer_cache_keeps_the_newest_entry_over_budget():
+    cache = _analyzer_cache(25)
+    cache.get('may', 'may')
+    cache.get('year', 'year', size=100)
+    assert list(cache.entries) == ['year']
+    assert cache.total_bytes == 100
+
+
+def test_analyzer_cache_remeasures_on_hits():
+    cache = _analyzer_cache(25)
+    may = cache.get('may', 'may')
+    cache.get('june', 'june')
+    # May's analyzer cached derived columns since it was loaded
+    may.size = 20
+    assert cache.get('may', 'may') is may
+    assert list(cache.entries) == ['may']
+    assert cache.sizes == {'may': 20}
+
+
+def test_concurrent_misses_on_one_key_load_once():
+    loads = []
+    started, release = threading.Event(), threading.Event()
+
+    def slow_load(name):
+        loads.append(name)
+        started.set()
+        release.wait(5)
+        return _Loaded(name, 10)
+
+    cache = AnalyzerCache(slow_load, 100, sizeof=lambda analyzer: analyzer.size)
+    results = {}
+    first = threading.Thread(target=lambda: results.setdefault('first', cache.get('may', 'may')))
+    second = threading.Thread(target=lambda: results.setdefault('second', cache.get('may', 'may')))
+    first.start()
+    assert started.wait(5)
+    second.start()
+    second.join(0.2)
+    assert second.is_alive(), "the second miss should wait for the first load"
+    release.set()
+    first.join(5)
+    second.join(5)
+    assert loads == ['may']
+    assert results['first'] is results['second']
+    assert cache.stats()['misses'] == 1 and cache.stats()['hits'] == 1
+
+
+def test_failed_load_lets_waiters_retry():
+    attempts = []
+
+    def flaky_load(name):
+        attempts.append(name)
+        if len(attempts) == 1:
+            raise OSError("extract not readable yet")
+        return _Loaded(name, 10)
+
+    cache = AnalyzerCache(flaky_load, 100, sizeof=lambda analyzer: analyzer.size)
+    with pytest.raises(OSError):
+        cache.get('may', 'may')
+    assert 'may' not in cache
+    assert cache.get('may', 'may').name == 'may'
+    assert attempts == ['may', 'may']
@@ -0,0 +1,69 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from iScale_Analysis_clean import EXPORT_FORMATS, export_analysis_results, iScaleAnalyzer, read_table, write_table
+from conftest import synthetic_consultations
+
+
+def _frame(n):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'funnel': pd.Categorical(rng.choice(['App', 'Bot', 'Web'], n)),
+        'slot_hour': rng.integers(0, 24, n),
+        'conversion_rate': rng.random(n) * 100,
+        'slot_start_time': pd.Timestamp('2025-06-01') + pd.to_timedelta(rng.integers(0, 10_000, n), unit='min'),
+        'target_class': rng.choice(['A', 'B', None], n),
+    })
+
+
+def _round_trip(tmp_path, frame, table_format, batch_rows):
+    path = tmp_path / f'table.{table_format}'
+    entry = write_table(frame, str(path), table_format, batch_rows)
+    manifest = tmp_path / 'manifest.json'
+    manifest.write_text(json.dumps({'tables': {'table': {'path': path.name, 'format': table_format, **entry}}}))
+    return entry, read_table(str(manifest), 'table')
+
+
+@pytest.mark.parametrize('table_format', EXPORT_FORMATS)
+def test_batched_table_round_trips(tmp_path, table_format):
+    frame = _frame(103)
+    entry, back = _round_trip(tmp_path, frame, table_format, batch_rows=10)
+    assert entry['rows'] == 103
+    pd.testing.assert_frame_equal(back, frame, check_dtype=False)
+    assert {col: str(dtype) for col, dtype in back.dtypes.items()} == entry['columns']
+
+
+@pytest.mark.parametrize('table_format', EXPORT_FORMATS)
+def test_empty_table_round_trips(tmp_path, table_format):
+    # An analysis over a slice with no rows: the columns keep their dtypes
+    frame = _frame(20).iloc[:0]
+    entry, back = _round_trip(tmp_path, frame, table_format, batch_rows=10)
+    assert entry['rows'] == 0 and len(back) == 0
+    assert {col: str(dtype) for col, dtype in back.dtypes.items()} == entry['columns']
+
+
+@pytest.mark.parametrize('table_format', EXPORT_FORMATS)
+def test_export_reads_back_through_the_manifest(write_csv, tmp_path, table_format):
+    analyzer = iScaleAnalyzer(write_csv(synthetic_consultations(3000, seed=4, dirty=True)))
+    assert analyzer.load_and_process_data()
+    output = tmp_path / 'out' / 'results.json'
+    os.makedirs(output.parent)
+    assert export_analysis_results(analyzer, str(output), table_format, batch_rows=25)
+
+    manifest = json.loads(output.read_text())
+    assert (output.parent / manifest['quality']).is_file()
+    expected = {
+        'conversion_7d': analyzer.calculate_conversion_rates(7),
+        'hourly_performance': analyzer.analyze_hourly_performance(),
+        'funnel_performance': analyzer.analyze_funnel_performance(),
+        'first_touch': analyzer.analyze_user_journeys()['first_touch'],
+    }
+    for name, frame in expected.items():
+        back = read_table(str(output), name)
+        assert manifest['tables'][name]['rows'] == len(frame)
+        pd.testing.assert_frame_equal(back, frame.reset_index(drop=True), check_dtype=False,
+                                      check_categorical=False, obj=name)
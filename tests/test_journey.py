@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+from iScale_Backend import PandasBackend
+from iScale_Journey import JOURNEY_COLUMNS, JOURNEY_OUTPUT_COLUMNS, build_user_journeys
+from conftest import synthetic_consultations
+
+
+def _rows(records):
+    df = pd.DataFrame.from_records(records, columns=['user_id', 'slot_start_time', 'payment_time', 'funnel'])
+    for col in ('slot_start_time', 'payment_time'):
+        df[col] = pd.to_datetime(df[col])
+    df['lead_type'] = df['funnel'] + '_lead'
+    return df
+
+
+def _by_user(journeys):
+    return journeys.set_index('user_id')
+
+
+def reference_journeys(df):
+    """Row-by-row restatement of the journey rules, for comparison."""
+    rows = []
+    df = df[df['user_id'].notna()].reset_index(drop=True)
+    for user in pd.unique(df['user_id']):
+        touches = df[df['user_id'] == user]
+        slots = touches['slot_start_time']
+        touches = touches.assign(_nat=slots.isna()).sort_values(['_nat', 'slot_start_time'], kind='stable')
+        first_payment = touches['payment_time'].min()
+        converted = pd.notna(first_payment)
+        before = int((touches['slot_start_time'] <= first_payment).sum()) if converted else 0
+        to_conversion = max(before, 1) if converted else 0
+        last = touches.iloc[to_conversion - 1] if converted else touches.iloc[-1]
+        first = touches.iloc[0]
+        rows.append((user, len(touches), int(converted), to_conversion,
+                     first['funnel'], first['lead_type'], last['funnel'], last['lead_type']))
+    return pd.DataFrame.from_records(rows, columns=JOURNEY_OUTPUT_COLUMNS)
+
+
+def test_empty_frame():
+    journeys = build_user_journeys(_rows([]))
+    assert list(journeys.columns) == JOURNEY_OUTPUT_COLUMNS
+    assert journeys.empty
+
+
+def test_unconverted_user_is_attributed_to_last_touch():
+    journeys = _by_user(build_user_journeys(_rows([
+        (1, '2025-06-03', None, 'Web'),
+        (1, '2025-06-01', None, 'Bot'),
+        (1, '2025-06-02', None, 'App'),
+    ])))
+    assert journeys.loc[1, ['consultations', 'converted', 'consultations_to_conversion']].tolist() == [3, 0, 0]
+    assert journeys.loc[1, ['first_funnel', 'last_funnel']].tolist() == ['Bot', 'Web']
+
+
+def test_conversion_counts_touches_up_to_the_first_payment():
+    journeys = _by_user(build_user_journeys(_rows([
+        (1, '2025-06-01', None, 'Bot'),
+        (1, '2025-06-05', '2025-06-09', 'Web'),
+        (1, '2025-06-03', '2025-06-04', 'App'),
+        (1, '2025-06-10', None, 'Referral'),
+    ])))
+    assert journeys.loc[1, ['consultations', 'converted', 'consultations_to_conversion']].tolist() == [4, 1, 2]
+    assert journeys.loc[1, ['first_funnel', 'last_funnel']].tolist() == ['Bot', 'App']
+
+
+def test_payment_before_every_slot_counts_one_touch():
+    journeys = _by_user(build_user_journeys(_rows([
+        (1, '2025-06-05', '2025-06-01', 'Web'),
+        (1, '2025-06-07', None, 'Bot'),
+    ])))
+    assert journeys.loc[1, ['converted', 'consultations_to_conversion', 'last_funnel']].tolist() == [1, 1, 'Web']
+
+
+def test_unparsed_slots_sort_last_and_null_users_are_dropped():
+    journeys = build_user_journeys(_rows([
+        (2, None, None, 'App'),
+        (np.nan, '2025-06-01', '2025-06-02', 'Bot'),
+        (2, '2025-06-04', None, 'Web'),
+        (3, None, '2025-06-08', 'Referral'),
+    ]))
+    assert journeys['user_id'].tolist() == [2, 3]
+    by_user = _by_user(journeys)
+    assert by_user.loc[2, ['first_funnel', 'last_funnel']].tolist() == ['Web', 'App']
+    # A converted user whose only slot is unparsed still counts one touch
+    assert by_user.loc[3, ['converted', 'consultations_to_conversion']].tolist() == [1, 1]
+
+
+def test_matches_reference_on_dirty_data():
+    backend = PandasBackend()
+    backend.prepare(synthetic_consultations(3000, seed=5, dirty=True).replace('', np.nan))
+    df = backend.columns(JOURNEY_COLUMNS)
+    expected = reference_journeys(df)
+    actual = build_user_journeys(df)
+    pd.testing.assert_frame_equal(actual.astype({'first_lead_type': object, 'last_lead_type': object}), expected,
+                                  check_dtype=False)
@@ -0,0 +1,53 @@
+import pandas as pd
+
+from iScale_Live import LiveBackend, verify_frame, with_duplicate_keys
+from conftest import synthetic_consultations
+
+
+def _snapshot(write_csv):
+    return pd.read_csv(write_csv(synthetic_consultations(4000, seed=7, dirty=True)))
+
+
+def test_replay_matches_batch(write_csv):
+    assert verify_frame(_snapshot(write_csv))
+
+
+def test_replay_with_duplicate_keys_matches_batch(write_csv):
+    snapshot = _snapshot(write_csv)
+    df = with_duplicate_keys(snapshot)
+    key = ['user_id', 'slot_start_time', 'expert_id']
+    assert df.duplicated(key).sum() == snapshot.duplicated(key).sum() + 3
+    assert verify_frame(df)
+
+
+def test_update_without_id_reaches_latest_booking_only():
+    live = LiveBackend()
+    booking = {'event': 'consultation', 'user_id': 1, 'expert_id': 2, 'slot_start_time': '2025-06-01 10:00:00',
+               'funnel': 'Bot', 'India vs NRI': 'India', 'medicalconditionflag': 'Yes', 'target_class': 'A'}
+    live.apply(booking)
+    live.apply(booking)
+    live.apply({'event': 'payment', 'user_id': 1, 'expert_id': 2, 'slot_start_time': '2025-06-01 10:00:00',
+                'payment_time': '2025-06-02 09:00:00'})
+    assert live.totals(['consultations', 'conversions']) == {'consultations': 2, 'conversions': 1}
+    assert live.quality['duplicate_consultations'] == 1
+
+
+def test_snapshot_is_not_cached_past_a_concurrent_event(monkeypatch):
+    import iScale_Live
+
+    live = LiveBackend()
+    booking = {'event': 'consultation', 'user_id': 1, 'expert_id': 2, 'slot_start_time': '2025-06-01 10:00:00',
+               'funnel': 'Bot', 'India vs NRI': 'India', 'medicalconditionflag': 'Yes', 'target_class': 'A'}
+    live.apply(booking)
+    categorize_keys = iScale_Live.categorize_keys
+
+    def arrives_while_building(*frames):
+        # An event lands after the state was copied but before the snapshot is cached
+        monkeypatch.setattr(iScale_Live, 'categorize_keys', categorize_keys)
+        live.apply({**booking, 'user_id': 2})
+        return categorize_keys(*frames)
+
+    monkeypatch.setattr(iScale_Live, 'categorize_keys', arrives_while_building)
+    assert live.snapshot().row_count() == 1
+    assert live.row_count() == 2
+    assert len(live.user_journeys()) == 2
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+import iScale_Matching
+from iScale_Matching import CoachLeadMatcher, SEGMENT_KEYS
+from iScale_Simulator import MIN_PRIOR_STRENGTH
+from conftest import synthetic_consultations
+
+
+def _rows(df):
+    df = df.assign(slot_start_time=pd.to_datetime(df['slot_start_time']))
+    return df.assign(
+        lead_type=df['India vs NRI'] + '_' + df['medicalconditionflag'],
+        slot_hour=df['slot_start_time'].dt.hour,
+        conversion_flag=(df['payment_time'] != '').astype(int),
+    )
+
+
+def test_no_class_effect_promises_no_uplift():
+    rows = _rows(synthetic_consultations(40000, seed=1))
+    history, leads = rows[rows['slot_start_time'] < '2025-06-30'], rows[rows['slot_start_time'] >= '2025-06-30']
+    _, report = CoachLeadMatcher.from_rows(history).match(leads[SEGMENT_KEYS + ['target_class', 'slot_hour']])
+    assert abs(report['expected_uplift_pct']) < 2
+
+
+def test_class_effect_is_scored():
+    rows = _rows(synthetic_consultations(40000, seed=1, class_effect=0.06))
+    history, leads = rows[rows['slot_start_time'] < '2025-06-30'], rows[rows['slot_start_time'] >= '2025-06-30']
+    matcher = CoachLeadMatcher.from_rows(history)
+    _, report = matcher.match(leads[SEGMENT_KEYS + ['target_class', 'slot_hour']])
+    assert report['assigned'] == len(leads)
+    scores = matcher.score_matrix().groupby('target_class')['expected_conversion_rate'].mean()
+    assert scores.idxmax() == 'A'
+    assert np.isfinite(report['expected_uplift'])
+
+
+def test_single_observation_cells_score_every_lead():
+    rng = np.random.default_rng(0)
+    cells = [(funnel, 'India_Medical', target_class, hour)
+             for funnel in ['Bot', 'Web'] for target_class in 'ABCD' for hour in range(24)
+             if rng.random() < 0.3]
+    stats = pd.DataFrame(cells, columns=SEGMENT_KEYS + ['target_class', 'slot_hour'])
+    stats['consultations'] = 1
+    stats['conversions'] = (rng.random(len(stats)) < 0.5).astype(int)
+    matcher = CoachLeadMatcher(stats)
+    assert matcher.prior_strength >= MIN_PRIOR_STRENGTH
+    assert np.isfinite(matcher.scores).all()
+    _, report = matcher.match(stats[SEGMENT_KEYS + ['target_class', 'slot_hour']])
+    assert report['assigned'] == len(stats)
+    assert np.isfinite(report['expected_uplift'])
+    assert 0 <= report['expected_conversions_current'] <= len(stats)
+
+
+def test_main_fits_only_on_earlier_days(write_csv, monkeypatch):
+    fitted = []
+    original = CoachLeadMatcher.from_rows.__func__
+    monkeypatch.setattr(CoachLeadMatcher, 'from_rows',
+                        classmethod(lambda cls, rows, **kw: fitted.append(rows) or original(cls, rows, **kw)))
+    matched, report = iScale_Matching.main(write_csv(synthetic_consultations(6000)), '2025-06-20')
+    assert fitted[0]['slot_start_time'].max() < pd.Timestamp('2025-06-20')
+    assert report['leads'] == len(matched) > 0
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+
+import iScale_Parallel
+from iScale_Backend import _compare
+from iScale_DA import iScaleDataAnalyzer
+from iScale_Parallel import CUBE_KEYS, ParallelBackend
+from conftest import synthetic_consultations
+
+FILTERS = {
+    'funnel': 'Bot',
+    'lead_type': ['NRI_Medical', 'India_NonMedical'],
+    'target_class': ['A'],
+    'expert_id': [3, 5, 8],
+    'slot_hour': [18, 19],
+    'slot_month': '2025-06',
+}
+
+
+@pytest.fixture(scope='module')
+def analyzers(tmp_path_factory):
+    path = tmp_path_factory.mktemp('parallel') / 'consultations.csv'
+    synthetic_consultations(8000, seed=3, dirty=True).to_csv(path, index=False)
+    with pytest.MonkeyPatch.context() as patch:
+        # Small enough that the file really splits into several partitions
+        patch.setattr(iScale_Parallel, 'MIN_PARTITION_BYTES', 1 << 16)
+        parallel = iScaleDataAnalyzer(str(path), backend=ParallelBackend(workers=2, partitions=4, shards=3))
+        assert parallel.load_and_process_data()
+    pandas = iScaleDataAnalyzer(str(path))
+    assert pandas.load_and_process_data()
+    return pandas, parallel
+
+
+def _results(analyzer):
+    return {
+        'rows': analyzer.backend.row_count(),
+        'users': analyzer.backend.distinct_count('user_id'),
+        'insights': analyzer.get_key_insights(),
+        'conversion_7d': analyzer.calculate_conversion_rates(7),
+        'journeys': analyzer.backend.user_journeys(),
+    }
+
+
+def test_filters_cover_every_cube_key():
+    assert set(FILTERS) == set(CUBE_KEYS)
+
+
+@pytest.mark.parametrize('column', list(FILTERS))
+def test_subset_matches_pandas(analyzers, column):
+    pandas, parallel = analyzers
+    filters = {column: FILTERS[column]}
+    mismatches = []
+    _compare(_results(pandas.subset(**filters)), _results(parallel.subset(**filters)), column, mismatches)
+    assert mismatches == []
+
+
+def test_combined_subset_matches_pandas(analyzers):
+    pandas, parallel = analyzers
+    filters = {'target_class': ['B', 'C'], 'slot_month': '2025-06', 'funnel': ['Web', 'App']}
+    mismatches = []
+    _compare(_results(pandas.subset(**filters)), _results(parallel.subset(**filters)), 'combined', mismatches)
+    assert mismatches == []
+
+
+def test_shards_are_reduced_from_their_files(analyzers):
+    pandas, parallel = analyzers
+    backend = parallel.backend
+    assert backend.quality['duplicate_consultations'] == pandas.backend.quality['duplicate_consultations'] > 0
+    assert len(backend.shards) == 3
+    assert all(os.path.isfile(path) for paths in backend.shards for path in paths)
+    # Only per-user journeys come back from the shards, never their rows
+    assert len(backend.user_journeys()) == len(backend.users) < backend.row_count()
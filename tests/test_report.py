@@ -0,0 +1,30 @@
+import os
+
+import iScale_Charts as charts
+import iScale_Report
+import iScale_Simulator
+from conftest import synthetic_consultations
+
+
+def test_simulator_change_invalidates_charts(tmp_path, monkeypatch):
+    before = iScale_Report._builder_version()
+    edited = tmp_path / 'iScale_Simulator.py'
+    edited.write_text(open(iScale_Simulator.__file__).read() + '\n# tweak\n')
+    monkeypatch.setattr(iScale_Simulator, '__file__', str(edited))
+    assert iScale_Report._builder_version() != before
+
+
+def test_one_bad_figure_does_not_abort_the_report(tmp_path, write_csv, monkeypatch):
+    build_chart = charts.build_chart
+
+    def flaky(name, inputs):
+        if name == 'funnel_volume':
+            raise ValueError("broken builder")
+        return build_chart(name, inputs)
+
+    monkeypatch.setattr(charts, 'build_chart', flaky)
+    names = ['funnel_volume', 'hourly_performance_analysis']
+    report = iScale_Report.render_report({'sample': write_csv(synthetic_consultations(3000))},
+                                         str(tmp_path / 'out'), chart_names=names, workers=1, image_format='html')
+    assert [path for path, _ in report['failed']] == [os.path.join('sample', 'all', 'funnel_volume.html')]
+    assert report['rendered'] == [os.path.join('sample', 'all', 'hourly_performance_analysis.html')]
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+from iScale_Simulator import MIN_PRIOR_STRENGTH, SlotPolicySimulator, estimate_prior_strength
+
+FUNNELS = ['Bot', 'Web', 'App', 'Referral']
+LEAD_TYPES = ['India_Medical', 'India_NonMedical', 'NRI_Medical', 'NRI_NonMedical']
+
+
+def hourly_stats(seed, peak_effect=0.0, peak_hours=(18, 19, 20), volume=150):
+    """Per (segment, hour) counts with a flat 6% conversion rate plus ``peak_effect`` in ``peak_hours``."""
+    rng = np.random.default_rng(seed)
+    funnel, lead_type, hour = (a.ravel() for a in np.meshgrid(FUNNELS, LEAD_TYPES, np.arange(24), indexing='ij'))
+    consultations = rng.poisson(volume, len(hour))
+    rate = 0.06 + peak_effect * np.isin(hour, peak_hours)
+    return pd.DataFrame({
+        'funnel': funnel,
+        'lead_type': lead_type,
+        'slot_hour': hour,
+        'user_id': consultations,
+        'connectivity_flag': rng.binomial(consultations, 0.5),
+        'conversion_flag': rng.binomial(consultations, rate),
+    })
+
+
+def test_no_hourly_effect_gives_no_uplift():
+    relative = []
+    for seed in range(10):
+        simulator = SlotPolicySimulator(hourly_stats(seed), seed=0)
+        _, uplift = simulator.compare_peak_share(0.7, draws=500)
+        assert uplift['uplift_p5'] < 0 < uplift['uplift_p95']
+        relative.append(uplift['uplift_mean'] / simulator.conversions.sum())
+    assert abs(np.mean(relative)) < 0.02
+
+
+def test_fixed_weak_prior_reports_noise_as_uplift():
+    simulator = SlotPolicySimulator(hourly_stats(0), prior_strength=20, seed=0)
+    _, uplift = simulator.compare_peak_share(0.7, draws=500)
+    assert uplift['uplift_mean'] / simulator.conversions.sum() > 0.2
+
+
+def test_real_hourly_effect_is_found():
+    simulator = SlotPolicySimulator(hourly_stats(0, peak_effect=0.04), seed=0)
+    _, uplift = simulator.compare_peak_share(0.7, draws=500)
+    assert uplift['probability_better'] > 0.95
+    assert uplift['uplift_p5'] > 0
+
+
+def test_repeated_simulations_match():
+    simulator = SlotPolicySimulator(hourly_stats(0), seed=42)
+    first = simulator.compare_peak_share(0.7, draws=200)[1]['uplift_draws']
+    second = simulator.compare_peak_share(0.7, draws=200)[1]['uplift_draws']
+    np.testing.assert_array_equal(first, second)
+
+
+def test_sparse_cells_keep_a_positive_prior():
+    # one consultation per cell and every one converting in a single hour:
+    # the between-hour variance exceeds 1, which used to give a negative prior
+    trials = np.ones((2, 24))
+    successes = np.zeros((2, 24))
+    successes[:, 5] = 1
+    assert estimate_prior_strength(trials, successes) == MIN_PRIOR_STRENGTH
+    for seed in range(10):
+        simulator = SlotPolicySimulator(hourly_stats(seed, volume=0.2), seed=0)
+        _, uplift = simulator.compare_peak_share(0.7, draws=200)
+        assert np.isfinite(uplift['uplift_mean'])
+
+
+def test_sparse_dataset_recommendations(write_csv):
+    from iScale_Analysis_clean import iScaleAnalyzer
+    from conftest import synthetic_consultations
+
+    for seed in range(5):
+        analyzer = iScaleAnalyzer(write_csv(synthetic_consultations(80, seed=seed)))
+        assert analyzer.load_and_process_data()
+        assert analyzer.generate_actionable_recommendations()